@@ -0,0 +1,339 @@
+# chess/arena.py
+import argparse
+import math
+import os
+import queue
+import random
+import sys
+import time
+from collections import deque
+from . import chessAi
+from .engine import newGameState, EMPTY, KNIGHT, BISHOP, KING, TYPE_MASK
+from .epd import parseEpd
+from .pgn import getSan, writeGame
+from .transposition import TranspositionTable, PawnHashTable
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+ENGINE_OPTIONS = {"depth": ("maxDepth", int), "movetime": ("timeLimit", float), "nodes": ("nodeLimit", int)}
+PENDING_PER_WORKER = 2  # Số ván gửi trước cho mỗi tiến trình; nhỏ để SPRT dừng sớm không phí nhiều ván
+ARENA_SEED = 20240601
+
+arenaEngines = []  # Hai ArenaEngine của tiến trình trong pool, tạo một lần ở initArenaWorker
+
+
+def parseTimeControl(text):
+    # Kiểu cutechess: "giây[+tăng thêm]" hoặc "số nước/giây[+tăng thêm]" (mỗi số nước lại được cộng thêm giây).
+    # Trả về (số nước mỗi chặng hoặc None, giây, tăng thêm mỗi nước)
+    moves, _, rest = text.rpartition('/')
+    seconds, _, increment = rest.partition('+')
+    moves = int(moves) if moves else None
+    seconds = float(seconds)
+    increment = float(increment) if increment else 0.0
+    if seconds <= 0 or increment < 0 or moves is not None and moves < 1:
+        raise ValueError(f"Invalid time control {text!r}")
+    return moves, seconds, increment
+
+
+def parseEngineSpec(spec):
+    # "tên:depth=3,movetime=0.2,MOBILITY_WEIGHT=0.15": depth/movetime/nodes là tham số của findBestMove,
+    # tc (xem parseTimeControl) cho cấu hình một đồng hồ riêng,
+    # tên viết hoa là hằng số của chessAi được đổi tạm thời trong lúc cấu hình này tìm.
+    # Chỉ các hằng số được đọc lúc tìm kiếm mới có tác dụng (không phải các bảng đã tính sẵn khi nhập module)
+    name, _, settings = spec.rpartition(':')
+    options = {}
+    overrides = {}
+    for setting in filter(None, settings.split(',')):
+        key, separator, value = setting.partition('=')
+        key = key.strip()
+        if not separator:
+            raise ValueError(f"Expected name=value in engine setting {setting!r}")
+        try:
+            if key in ENGINE_OPTIONS:
+                optionName, convert = ENGINE_OPTIONS[key]
+                options[optionName] = convert(value)
+            elif key == "tc":
+                options["timeControl"] = parseTimeControl(value)
+            elif key.isupper() and type(getattr(chessAi, key, None)) in (int, float):
+                overrides[key] = type(getattr(chessAi, key))(value)
+            else:
+                raise ValueError(f"Unknown engine setting {key!r}")
+        except ValueError as error:
+            raise ValueError(f"Invalid engine setting {setting!r}: {error}") from None
+    return name or settings or "default", options, overrides
+
+
+class ArenaEngine:
+    # Một cấu hình findBestMove cùng bảng chuyển vị, bảng tốt và bảng lịch sử riêng: hai bên chơi trong
+    # cùng một tiến trình nhưng không dùng chung những gì đã học được trong ván
+    def __init__(self, spec, hashMB):
+        self.name, self.options, self.overrides = parseEngineSpec(spec)
+        self.timeControl = self.options.pop("timeControl", None)
+        self.transpositionTable = TranspositionTable(hashMB)
+        self.pawnHashTable = PawnHashTable()
+        self.historyTable = [0] * 4096
+
+    def newGame(self):
+        self.transpositionTable.clear()
+        self.pawnHashTable.clear()
+        self.historyTable[:] = [0] * 4096
+
+    def search(self, gs, validMoves, **clockOptions):
+        saved = {name: getattr(chessAi, name) for name in self.overrides}
+        savedTables = chessAi.transpositionTable, chessAi.pawnHashTable, chessAi.historyTable
+        chessAi.transpositionTable = self.transpositionTable
+        chessAi.pawnHashTable = self.pawnHashTable
+        chessAi.historyTable = self.historyTable
+        for name, value in self.overrides.items():
+            setattr(chessAi, name, value)
+        try:
+            results = queue.Queue()
+            chessAi.findBestMove(gs, validMoves, results, **{"timeLimit": None, **self.options, **clockOptions},
+                                 useBook=False)
+            return results.get()
+        finally:
+            for name, value in saved.items():
+                setattr(chessAi, name, value)
+            chessAi.transpositionTable, chessAi.pawnHashTable, chessAi.historyTable = savedTables
+
+
+def initArenaWorker(specs, hashMB):
+    global arenaEngines
+    arenaEngines = [ArenaEngine(spec, hashMB) for spec in specs]
+
+
+def insufficientMaterial(gs):
+    # Chỉ còn hai vua, hoặc thêm đúng một mã hay một tượng: không bên nào chiếu hết được
+    pieces = [piece & TYPE_MASK for piece in gs.squares if piece != EMPTY and piece & TYPE_MASK != KING]
+    return not pieces or len(pieces) == 1 and pieces[0] in (KNIGHT, BISHOP)
+
+
+def playGame(gameIndex, openingFen, whiteIndex, seed, backend="mailbox"):
+    # Một ván giữa arenaEngines[0] và arenaEngines[1] từ thế cờ openingFen, whiteIndex cầm trắng.
+    # Xử thắng/thua/hoà ngay khi chiếu hết, hết nước, luật 50 nước, lặp lại ba lần, không đủ quân hoặc hết giờ
+    start = time.perf_counter()
+    random.seed(seed)
+    for engine in arenaEngines:
+        engine.newGame()
+    gs = newGameState(backend, openingFen)
+    sanMoves = []
+    # Đồng hồ của từng cấu hình có tc: giây còn lại và số nước đã đi
+    clocks = [[engine.timeControl[1], 0] if engine.timeControl else None for engine in arenaEngines]
+    while True:
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            if gs.inCheck:
+                result, reason = ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+            else:
+                result, reason = "1/2-1/2", "stalemate"
+            break
+        if gs.fiftyMoveCounter >= 100:
+            result, reason = "1/2-1/2", "fifty-move rule"
+            break
+        if gs.repetitionCount() >= 3:
+            result, reason = "1/2-1/2", "repetition"
+            break
+        if insufficientMaterial(gs):
+            result, reason = "1/2-1/2", "insufficient material"
+            break
+        engineIndex = whiteIndex if gs.whiteToMove else 1 - whiteIndex
+        engine = arenaEngines[engineIndex]
+        clock = clocks[engineIndex]
+        if clock is None:
+            move = engine.search(gs, validMoves)
+        else:
+            sessionMoves, sessionSeconds, increment = engine.timeControl
+            movesToGo = sessionMoves - clock[1] % sessionMoves if sessionMoves else None
+            moveStart = time.perf_counter()
+            move = engine.search(gs, validMoves, timeLeft=clock[0], increment=increment, movesToGo=movesToGo)
+            clock[0] -= time.perf_counter() - moveStart
+            if clock[0] < 0:
+                result, reason = ("0-1" if gs.whiteToMove else "1-0"), "time forfeit"
+                break
+            clock[0] += increment
+            clock[1] += 1
+            if sessionMoves and clock[1] % sessionMoves == 0:
+                clock[0] += sessionSeconds
+        sanMoves.append(getSan(gs, move, validMoves))
+        gs.makeMove(move)
+    whitePoints = {"1-0": 1.0, "0-1": 0.0}.get(result, 0.5)
+    return {"game": gameIndex, "opening": openingFen, "white": arenaEngines[whiteIndex].name,
+            "black": arenaEngines[1 - whiteIndex].name, "result": result, "reason": reason,
+            "moves": [move.getUciNotation() for move in gs.moveLog], "san": sanMoves,
+            "score": whitePoints if whiteIndex == 0 else 1 - whitePoints, "time": time.perf_counter() - start}
+
+
+def readOpenings(file):
+    # Mỗi dòng là một FEN hoặc một dòng EPD (có ';'); kiểm tra ngay để báo lỗi trước khi chạy ván nào
+    openings = []
+    for lineNumber, line in enumerate(file, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fen = parseEpd(line)[0] if ';' in line else line
+        try:
+            newGameState("mailbox", fen)
+        except ValueError as error:
+            raise ValueError(f"line {lineNumber}: {error}") from None
+        openings.append(fen)
+    return openings
+
+
+def scoreToElo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1) + 0.0  # + 0.0 để không in ra -0.0
+
+
+def eloToScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def matchStats(wins, draws, losses):
+    # Hiệu Elo của cấu hình thứ nhất và sai số 95% (xấp xỉ chuẩn trên điểm trung bình mỗi ván)
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0, 0.0
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    elo = scoreToElo(score)
+    errorBar = (scoreToElo(score + margin) - scoreToElo(score - margin)) / 2
+    return elo, errorBar, variance
+
+
+def sprtLlr(wins, draws, losses, elo0, elo1):
+    # Log-likelihood ratio của H1 (elo1) so với H0 (elo0), xấp xỉ chuẩn theo điểm trung bình và phương sai
+    # ước lượng từ các ván đã chơi
+    games = wins + draws + losses
+    _, _, variance = matchStats(wins, draws, losses)
+    if games == 0 or variance == 0:
+        return 0.0
+    score = (wins + 0.5 * draws) / games
+    score0, score1 = eloToScore(elo0), eloToScore(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def runMatch(specs, openings, games, workers=1, hashMB=16, backend="mailbox", sprt=None, seed=ARENA_SEED,
+             out=sys.stdout, onGame=None):
+    # Chơi games ván (mỗi thế cờ khai cuộc hai ván đổi màu) trên pool tiến trình, in kết quả từng ván ngay
+    # khi xong. sprt = (elo0, elo1, alpha, beta): dừng sớm khi LLR vượt một trong hai ngưỡng
+    stats = {"wins": 0, "draws": 0, "losses": 0, "games": 0, "sprt": None}
+    bounds = None
+    if sprt is not None:
+        elo0, elo1, alpha, beta = sprt
+        bounds = (math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha))
+    start = time.perf_counter()
+
+    def tasks():
+        for gameIndex in range(games):
+            yield (gameIndex + 1, openings[gameIndex // 2 % len(openings)], gameIndex % 2, seed + gameIndex, backend)
+
+    def record(game):
+        # Trả về True khi SPRT đã có kết luận
+        stats["games"] += 1
+        stats["wins" if game["score"] == 1 else "losses" if game["score"] == 0 else "draws"] += 1
+        if onGame is not None:
+            onGame(game)
+        elo, errorBar, _ = matchStats(stats["wins"], stats["draws"], stats["losses"])
+        gamesPerHour = stats["games"] * 3600 / max(time.perf_counter() - start, 1e-9)
+        line = f"game {game['game']:5d}  {game['white']} - {game['black']}  {game['result']:7}  " \
+               f"{game['reason']:21}  {len(game['moves']):3d} plies  " \
+               f"+{stats['wins']} ={stats['draws']} -{stats['losses']}  elo {elo:+.1f} +/- {errorBar:.1f}"
+        if bounds is not None:
+            llr = sprtLlr(stats["wins"], stats["draws"], stats["losses"], elo0, elo1)
+            line += f"  llr {llr:.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]"
+            if llr <= bounds[0]:
+                stats["sprt"] = "H0"
+            elif llr >= bounds[1]:
+                stats["sprt"] = "H1"
+        out.write(line + f"  {gamesPerHour:.0f} games/h\n")
+        out.flush()
+        return stats["sprt"] is not None
+
+    if workers == 1:
+        initArenaWorker(specs, hashMB)
+        for task in tasks():
+            if record(playGame(*task)):
+                break
+    else:
+        from multiprocessing import Pool
+        with Pool(workers, initializer=initArenaWorker, initargs=(specs, hashMB)) as pool:
+            # Pool.__exit__ dừng các ván còn đang chơi khi SPRT kết thúc sớm
+            pending = deque()
+            for task in tasks():
+                pending.append(pool.apply_async(playGame, task))
+                if len(pending) >= workers * PENDING_PER_WORKER and record(pending.popleft().get()):
+                    break
+            while pending and stats["sprt"] is None:
+                record(pending.popleft().get())
+    stats["time"] = time.perf_counter() - start
+    stats["elo"], stats["errorBar"], _ = matchStats(stats["wins"], stats["draws"], stats["losses"])
+    stats["gamesPerHour"] = stats["games"] * 3600 / max(stats["time"], 1e-9)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chess.arena",
+                                     description="Play two search configurations against each other without pygame.")
+    parser.add_argument("engines", nargs=2, metavar="ENGINE",
+                        help="engine as [name:]setting=value,... with depth, movetime, nodes, tc (seconds[+inc] "
+                             "or moves/seconds[+inc]) or an upper-case chessAi constant, "
+                             "e.g. new:depth=3,MOBILITY_WEIGHT=0.15")
+    parser.add_argument("--games", type=int, default=100, help="number of games (rounded up to an even number)")
+    parser.add_argument("--openings", help="file with one FEN or EPD position per line (default: start position)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of game processes")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size per engine, in MB")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--sprt", help="stop early on a sequential probability ratio test: elo0,elo1 (e.g. 0,10)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT false negative rate")
+    parser.add_argument("--seed", type=int, default=ARENA_SEED)
+    parser.add_argument("--pgn", help="append every finished game to this PGN file")
+    args = parser.parse_args(argv)
+
+    if args.games < 1 or args.workers < 1 or args.hash < 1:
+        parser.error("--games, --workers and --hash must be at least 1")
+    try:
+        for spec in args.engines:
+            parseEngineSpec(spec)
+        if args.openings:
+            with open(args.openings) as file:
+                openings = readOpenings(file)
+        else:
+            openings = [START_FEN]
+        sprt = None
+        if args.sprt:
+            elo0, elo1 = (float(value) for value in args.sprt.split(','))
+            sprt = (elo0, elo1, args.alpha, args.beta)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if not openings:
+        parser.error("the openings file has no positions")
+
+    pgnFile = None
+    onGame = None
+    if args.pgn:
+        try:
+            pgnFile = open(args.pgn, "a")
+        except OSError as error:
+            parser.error(str(error))
+        date = time.strftime("%Y.%m.%d")
+
+        def onGame(game):
+            writeGame(pgnFile, {"Event": "Arena", "Date": date, "Round": game["game"], "White": game["white"],
+                                "Black": game["black"]}, game["san"], game["result"], game["opening"], game["reason"])
+            pgnFile.flush()
+    try:
+        stats = runMatch(args.engines, openings, args.games + args.games % 2, args.workers, args.hash, args.backend,
+                         sprt, args.seed, onGame=onGame)
+    finally:
+        if pgnFile is not None:
+            pgnFile.close()
+    names = [parseEngineSpec(spec)[0] for spec in args.engines]
+    print(f"{names[0]} vs {names[1]}: +{stats['wins']} ={stats['draws']} -{stats['losses']}  "
+          f"elo {stats['elo']:+.1f} +/- {stats['errorBar']:.1f}  {stats['games']} games in {stats['time']:.1f}s  "
+          f"{stats['gamesPerHour']:.0f} games/h" + (f"  SPRT accepted {stats['sprt']}" if stats["sprt"] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# chess/bench.py
+import argparse
+import json
+import queue
+import random
+import sys
+import time
+from . import chessAi
+from .engine import newGameState
+
+BENCH_SEED = 20240601
+
+# Thế cờ cố định cho benchmark tìm kiếm: trung cuộc và tàn cuộc
+BENCH_POSITIONS = [
+    ("italian", "r1bq1rk1/pppp1ppp/2n2n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7"),
+    ("queens gambit", "r2q1rk1/pp1nbppp/2p1pn2/3p2B1/2PP4/2NBPN2/PP3PPP/R2QK2R w KQ - 0 9"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("open middlegame", "r3k2r/2pb1ppp/2pp1q2/p7/1nP1B3/1P2P3/P2N1PPP/R2QK2R w KQkq a6 0 14"),
+    ("closed middlegame", "r1bq1rk1/pp2b1pp/n1pp1n2/3P1p2/2P1p3/2N1P2N/PP2BPPP/R1BQ1RK1 b - - 2 10"),
+    ("heavy pieces", "4rrk1/2p1b1p1/p1p3q1/4p3/2P2n1p/1P1NR2P/PB3PP1/3R1QK1 b - - 2 24"),
+    ("rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+    ("pawn endgame", "8/8/1p2k1p1/3p3p/1p1P1P1P/1P2PK2/8/8 w - - 3 54"),
+    ("minor piece endgame", "8/5k2/3p4/1p1Pp2p/pP2Pp1P/P4P1K/8/3B4 w - - 0 1"),
+    ("queen endgame", "6k1/5pp1/7p/8/3Q4/6P1/5P1P/3q2K1 w - - 0 40"),
+]
+
+
+def benchPosition(name, fen, depth, nodeLimit, backend, threads=1):
+    # Tìm một thế cờ với trạng thái sạch để kết quả chỉ phụ thuộc vào mã nguồn
+    chessAi.newGame()
+    gs = newGameState(backend, fen)
+    iterations = []
+    results = queue.Queue()
+    start = time.perf_counter()
+    chessAi.findBestMove(gs, gs.getValidMoves(), results, timeLimit=None, maxDepth=depth, nodeLimit=nodeLimit,
+                         shuffle=False, onIteration=lambda info: iterations.append(dict(info)), threads=threads)
+    elapsed = time.perf_counter() - start
+    move = results.get()
+
+    nodes = chessAi.nodesSearched
+    previousNodes = 0
+    timeToDepth = []
+    iterationNodes = []
+    for info in iterations:
+        iterationNodes.append(info["nodes"] - previousNodes)
+        previousNodes = info["nodes"]
+        timeToDepth.append({"depth": info["depth"], "nodes": info["nodes"], "time": round(info["time"], 4)})
+    # Hệ số rẽ nhánh hiệu dụng: trung bình nhân tỉ lệ số nút giữa hai lần lặp liên tiếp
+    branchingFactor = None
+    if len(iterationNodes) > 1 and iterationNodes[0] > 0:
+        branchingFactor = round((iterationNodes[-1] / iterationNodes[0]) ** (1 / (len(iterationNodes) - 1)), 3)
+    lastInfo = iterations[-1] if iterations else {"depth": 0, "score": 0, "pv": []}
+    return {
+        "name": name,
+        "fen": fen,
+        "move": move.getUciNotation() if move is not None else None,
+        "score": round(lastInfo["score"], 3),
+        "depth": lastInfo["depth"],
+        "pv": [pvMove.getUciNotation() for pvMove in lastInfo["pv"]],
+        "nodes": nodes,
+        "time": round(elapsed, 4),
+        "nps": round(nodes / max(elapsed, 1e-9)),
+        "timeToDepth": timeToDepth,
+        "branchingFactor": branchingFactor,
+        "helperNodes": chessAi.helperNodesSearched if threads > 1 else 0,
+    }
+
+
+def runBench(depth=3, nodeLimit=None, backend="mailbox", positions=BENCH_POSITIONS, threads=1):
+    random.seed(BENCH_SEED)
+    results = [benchPosition(name, fen, depth, nodeLimit, backend, threads) for name, fen in positions]
+    totalNodes = sum(result["nodes"] for result in results)
+    totalTime = sum(result["time"] for result in results)
+    return {
+        "depth": depth,
+        "nodeLimit": nodeLimit,
+        "backend": backend,
+        "threads": threads,
+        "positions": results,
+        "total": {"nodes": totalNodes, "time": round(totalTime, 4), "nps": round(totalNodes / max(totalTime, 1e-9))},
+    }
+
+
+def runScaling(threadCounts, depth=3, backend="mailbox", positions=BENCH_POSITIONS):
+    # Lazy SMP: so thời gian tới cùng độ sâu của từng số tiến trình với lần chạy một tiến trình
+    runs = []
+    for threads in threadCounts:
+        report = runBench(depth, None, backend, positions, threads)
+        totalTime = report["total"]["time"]
+        runs.append({"threads": threads, "time": totalTime, "nodes": report["total"]["nodes"],
+                     "helperNodes": sum(result["helperNodes"] for result in report["positions"]),
+                     "moves": [result["move"] for result in report["positions"]]})
+    baseTime = runs[0]["time"]
+    for run in runs:
+        run["speedup"] = round(baseTime / max(run["time"], 1e-9), 3)
+    return {"depth": depth, "backend": backend, "scaling": runs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chess.bench",
+                                     description="Run the search on fixed positions and print JSON results.")
+    parser.add_argument("--depth", type=int, help="search depth for every position (default 3, or unlimited with --nodes)")
+    parser.add_argument("--nodes", type=int, help="stop each search after about this many nodes")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--threads", type=int, default=1, help="number of Lazy SMP search processes")
+    parser.add_argument("--scaling", help="comma-separated process counts, e.g. 1,2,4: report the speedup to a "
+                                          "fixed depth for each (the first count is the baseline)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    depth = args.depth
+    if depth is None and args.nodes is None:
+        depth = 3
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+    if args.scaling:
+        try:
+            threadCounts = [int(count) for count in args.scaling.split(",")]
+        except ValueError:
+            parser.error(f"invalid --scaling list: {args.scaling}")
+        if depth is None or min(threadCounts) < 1:
+            parser.error("--scaling needs a fixed --depth and process counts of at least 1")
+        report = runScaling(threadCounts, depth, args.backend)
+    else:
+        report = runBench(depth, args.nodes, args.backend, threads=args.threads)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+        if args.scaling:
+            for run in report["scaling"]:
+                print(f"threads {run['threads']}  time {run['time']:.2f}s  speedup {run['speedup']:.2f}")
+        else:
+            total = report["total"]
+            print(f"nodes {total['nodes']}  time {total['time']:.2f}s  {total['nps']} nps -> {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+# chess/bitbase.py
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from .engine import newGameState, RAYS, EMPTY, PAWN, ROOK, QUEEN, KING, WHITE, TYPE_MASK, COLOR_MASK
+
+# Bảng thắng/hoà cho tàn cuộc Vua + một quân (Tốt, Xe, Hậu) gặp Vua trơ trọi, tạo bằng phân tích ngược.
+# Bên có quân luôn được quy về Trắng (lật bàn theo hàng nếu là Đen); bên Vua trơ trọi không thể thắng
+# nên mỗi thế cờ chỉ cần 1 bit: bên mạnh thắng hay không. Chỉ số = bên đi, Vua trắng, Vua đen, quân trắng,
+# mỗi phần 6 bit (ô 0 là a8 như GameState.squares), tổng 2 * 64^3 bit = 64 KB mỗi bảng
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bitbases')
+BITBASE_PIECES = {QUEEN: "kqk", ROOK: "krk", PAWN: "kpk"}
+BITBASE_SIZE = 2 * 64 * 64 * 64
+WHITE_TO_MOVE = 0
+BLACK_TO_MOVE = 1
+
+KING_TARGETS = [[ray[0] for ray in RAYS[sq] if ray] for sq in range(64)]
+KING_MASKS = [sum(1 << target for target in KING_TARGETS[sq]) for sq in range(64)]
+PIECE_DIRECTIONS = {QUEEN: range(8), ROOK: range(4)}
+
+
+def bitbaseIndex(sideToMove, whiteKing, blackKing, pieceSq):
+    return ((sideToMove << 6 | whiteKing) << 6 | blackKing) << 6 | pieceSq
+
+
+def pieceAttacks(pieceType, pieceSq, blocker):
+    # Các ô quân trắng ở pieceSq tấn công (bitmask); chỉ Vua trắng cản đường vì Vua đen bị bỏ ra khi xét nước của nó
+    if pieceType == PAWN:
+        row, col = divmod(pieceSq, 8)
+        mask = 0
+        if row > 0:
+            if col > 0:
+                mask |= 1 << (pieceSq - 9)
+            if col < 7:
+                mask |= 1 << (pieceSq - 7)
+        return mask
+    mask = 0
+    for direction in PIECE_DIRECTIONS[pieceType]:
+        for target in RAYS[pieceSq][direction]:
+            mask |= 1 << target
+            if target == blocker:
+                break
+    return mask
+
+
+def generateBitbase(pieceType, promotionTables=None):
+    # Phân tích ngược: bắt đầu từ các thế chiếu hết (và với KPK, các nước phong cấp thành thế thắng của
+    # KQK/KRK), lan ngược qua các nước không ăn quân. Thế Trắng đi thắng khi có một nước tới thế thắng;
+    # thế Đen đi thắng khi mọi nước hợp lệ của Đen đều tới thế thắng (đếm ngược số nước còn lại)
+    win = bytearray(BITBASE_SIZE)
+    remaining = bytearray(BITBASE_SIZE)
+    legal = bytearray(BITBASE_SIZE)
+    queue = deque()
+    attackCache = {}
+
+    def whiteAttacks(whiteKing, pieceSq):
+        key = whiteKing << 6 | pieceSq
+        mask = attackCache.get(key)
+        if mask is None:
+            mask = attackCache[key] = KING_MASKS[whiteKing] | pieceAttacks(pieceType, pieceSq, whiteKing)
+        return mask
+
+    pieceSquares = range(8, 56) if pieceType == PAWN else range(64)
+    for whiteKing in range(64):
+        for blackKing in range(64):
+            if blackKing == whiteKing or KING_MASKS[whiteKing] >> blackKing & 1:
+                continue
+            for pieceSq in pieceSquares:
+                if pieceSq == whiteKing or pieceSq == blackKing:
+                    continue
+                attacks = whiteAttacks(whiteKing, pieceSq)
+                inCheck = attacks >> blackKing & 1
+                if not inCheck:
+                    legal[bitbaseIndex(WHITE_TO_MOVE, whiteKing, blackKing, pieceSq)] = 1
+                index = bitbaseIndex(BLACK_TO_MOVE, whiteKing, blackKing, pieceSq)
+                legal[index] = 1
+                moves = 0
+                for target in KING_TARGETS[blackKing]:
+                    if target == pieceSq:
+                        # Ăn quân không được bảo vệ: về Vua đối Vua, hoà; nước này không bao giờ được đếm ngược
+                        if not KING_MASKS[whiteKing] >> target & 1:
+                            moves += 1
+                    elif not attacks >> target & 1:
+                        moves += 1
+                if moves == 0:
+                    if inCheck:
+                        win[index] = 1
+                        queue.append(index)
+                else:
+                    remaining[index] = moves
+
+    if pieceType == PAWN:
+        # Phong cấp thành Hậu hoặc Xe (tránh hết nước) rồi tra bảng tương ứng với Đen đi
+        for whiteKing in range(64):
+            for blackKing in range(64):
+                for pieceSq in range(8, 16):
+                    index = bitbaseIndex(WHITE_TO_MOVE, whiteKing, blackKing, pieceSq)
+                    target = pieceSq - 8
+                    if not legal[index] or target == whiteKing or target == blackKing:
+                        continue
+                    promotedIndex = bitbaseIndex(BLACK_TO_MOVE, whiteKing, blackKing, target)
+                    if any(table[promotedIndex] for table in promotionTables):
+                        win[index] = 1
+                        queue.append(index)
+
+    while queue:
+        index = queue.popleft()
+        pieceSq = index & 63
+        blackKing = index >> 6 & 63
+        whiteKing = index >> 12 & 63
+        if index >> 18:
+            # Thế Đen đi thắng: mọi thế Trắng đi vừa dẫn tới nó cũng thắng
+            predecessors = []
+            for origin in KING_TARGETS[whiteKing]:
+                if origin != blackKing and origin != pieceSq and not KING_MASKS[origin] >> blackKing & 1:
+                    predecessors.append(bitbaseIndex(WHITE_TO_MOVE, origin, blackKing, pieceSq))
+            if pieceType == PAWN:
+                origin = pieceSq + 8
+                if origin < 56 and origin != whiteKing and origin != blackKing:
+                    predecessors.append(bitbaseIndex(WHITE_TO_MOVE, whiteKing, blackKing, origin))
+                    origin += 8
+                    if origin >> 3 == 6 and origin != whiteKing and origin != blackKing:
+                        predecessors.append(bitbaseIndex(WHITE_TO_MOVE, whiteKing, blackKing, origin))
+            else:
+                for direction in PIECE_DIRECTIONS[pieceType]:
+                    for origin in RAYS[pieceSq][direction]:
+                        if origin == whiteKing or origin == blackKing:
+                            break
+                        predecessors.append(bitbaseIndex(WHITE_TO_MOVE, whiteKing, blackKing, origin))
+            for predecessor in predecessors:
+                if legal[predecessor] and not win[predecessor]:
+                    win[predecessor] = 1
+                    queue.append(predecessor)
+        else:
+            # Thế Trắng đi thắng: bớt một nước thoát của mỗi thế Đen đi dẫn tới nó
+            for origin in KING_TARGETS[blackKing]:
+                if origin == whiteKing or origin == pieceSq or KING_MASKS[whiteKing] >> origin & 1:
+                    continue
+                predecessor = bitbaseIndex(BLACK_TO_MOVE, whiteKing, origin, pieceSq)
+                if not win[predecessor] and remaining[predecessor]:
+                    remaining[predecessor] -= 1
+                    if remaining[predecessor] == 0:
+                        win[predecessor] = 1
+                        queue.append(predecessor)
+    return win
+
+
+def packBits(flags):
+    packed = bytearray(len(flags) // 8)
+    for index in range(0, len(flags), 8):
+        byte = 0
+        for bit in range(8):
+            if flags[index + bit]:
+                byte |= 1 << bit
+        packed[index >> 3] = byte
+    return packed
+
+
+def generateBitbases(outputDir=BITBASE_DIR, out=sys.stderr):
+    # KQK và KRK trước vì KPK tra chúng khi tốt phong cấp
+    os.makedirs(outputDir, exist_ok=True)
+    tables = {}
+    for pieceType in (QUEEN, ROOK, PAWN):
+        start = time.perf_counter()
+        promotionTables = (tables[QUEEN], tables[ROOK]) if pieceType == PAWN else None
+        tables[pieceType] = generateBitbase(pieceType, promotionTables)
+        path = os.path.join(outputDir, BITBASE_PIECES[pieceType] + ".bin")
+        with open(path, "wb") as file:
+            file.write(packBits(tables[pieceType]))
+        out.write(f"{BITBASE_PIECES[pieceType].upper()}: {sum(tables[pieceType])} wins, "
+                  f"{time.perf_counter() - start:.1f}s -> {path}\n")
+
+
+class Bitbases:
+    # Các bảng đã tạo trong thư mục directory, ánh xạ vào bộ nhớ; bảng thiếu file thì bỏ qua
+    def __init__(self, directory=BITBASE_DIR):
+        self.tables = {}
+        self.files = []
+        for pieceType, name in BITBASE_PIECES.items():
+            path = os.path.join(directory, name + ".bin")
+            if not os.path.exists(path) or os.path.getsize(path) != BITBASE_SIZE // 8:
+                continue
+            file = open(path, "rb")
+            self.files.append(file)
+            self.tables[pieceType] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for file in self.files:
+            file.close()
+        self.tables = {}
+        self.files = []
+
+    def probe(self, gs):
+        # 1: bên đi thắng, 0: hoà, -1: bên đi thua; None nếu thế cờ không phải Vua + một quân đối Vua có bảng
+        if not self.tables:
+            return None
+        kings = [0, 0]
+        pieceSq = piece = None
+        for sq, value in enumerate(gs.squares):
+            if value == EMPTY:
+                continue
+            if value & TYPE_MASK == KING:
+                kings[value >> 3] = sq
+            elif piece is None:
+                pieceSq, piece = sq, value
+            else:
+                return None
+        if piece is None:
+            return None
+        table = self.tables.get(piece & TYPE_MASK)
+        if table is None:
+            return None
+        strongIsWhite = piece & COLOR_MASK == WHITE
+        sideToMove = WHITE_TO_MOVE if gs.whiteToMove == strongIsWhite else BLACK_TO_MOVE
+        if strongIsWhite:
+            index = bitbaseIndex(sideToMove, kings[0], kings[1], pieceSq)
+        else:
+            index = bitbaseIndex(sideToMove, kings[1] ^ 56, kings[0] ^ 56, pieceSq ^ 56)
+        if not table[index >> 3] >> (index & 7) & 1:
+            return 0
+        return 1 if sideToMove == WHITE_TO_MOVE else -1
+
+
+def main(argv=None):
+    import argparse  # chỉ cần cho dòng lệnh; module này được chessAi nhập lúc khởi động
+    parser = argparse.ArgumentParser(prog="python -m chess.bitbase",
+                                     description="Generate or query the KPK, KRK and KQK endgame bitbases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="build the bitbases by retrograde analysis")
+    generate.add_argument("--output", default=BITBASE_DIR, help="directory for the .bin files")
+    probe = commands.add_parser("probe", help="look up a position")
+    probe.add_argument("fen")
+    probe.add_argument("--dir", default=BITBASE_DIR, help="directory with the .bin files")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generateBitbases(args.output)
+        return 0
+    try:
+        gs = newGameState("mailbox", args.fen)
+    except ValueError as error:
+        parser.error(str(error))
+    result = Bitbases(args.dir).probe(gs)
+    print({None: "not in the bitbases", 1: "win for the side to move", 0: "draw",
+           -1: "loss for the side to move"}[result])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
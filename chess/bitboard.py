@@ -0,0 +1,389 @@
+# chess/bitboard.py
+from .engine import (GameState, Move, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK,
+                     TYPE_MASK, COLOR_MASK, DIRECTIONS, KNIGHT_OFFSETS, MOVE_END_SHIFT, MOVE_PROMOTION_SHIFT,
+                     MOVE_PIECE_SHIFT, MOVE_CAPTURED_SHIFT, ENPASSANT_FLAG, CASTLE_FLAG, PROMOTION_ROWS,
+                     PLAYER_WANTS_TO_PLAY_AS_BLACK)
+
+# Bit thứ sq ứng với ô squares[sq] (sq = row * 8 + col, bit 0 là a8)
+FULL_BOARD = (1 << 64) - 1
+NOT_FILE_A = sum(1 << sq for sq in range(64) if sq & 7 != 0)
+NOT_FILE_H = sum(1 << sq for sq in range(64) if sq & 7 != 7)
+ROW_MASKS = tuple(0xFF << (row * 8) for row in range(8))
+
+# Các hướng 0-3 (hàng/cột) cho Xe, 4-7 (chéo) cho Tượng; hướng có bước dương thì
+# ô chặn gần nhất là bit thấp nhất, hướng âm thì là bit cao nhất
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+POSITIVE_DIRECTION = tuple(dRow * 8 + dCol > 0 for dRow, dCol in DIRECTIONS)
+
+
+def buildStepAttacks(offsets):
+    attacks = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dRow, dCol in offsets:
+            if 0 <= row + dRow < 8 and 0 <= col + dCol < 8:
+                bb |= 1 << ((row + dRow) * 8 + col + dCol)
+        attacks.append(bb)
+    return tuple(attacks)
+
+
+def buildRayMasks():
+    masks = []
+    for dRow, dCol in DIRECTIONS:
+        directionMasks = []
+        for sq in range(64):
+            row, col = divmod(sq, 8)
+            bb = 0
+            endRow, endCol = row + dRow, col + dCol
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                bb |= 1 << (endRow * 8 + endCol)
+                endRow += dRow
+                endCol += dCol
+            directionMasks.append(bb)
+        masks.append(tuple(directionMasks))
+    return tuple(masks)
+
+
+KNIGHT_ATTACKS = buildStepAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = buildStepAttacks(DIRECTIONS)
+# Hướng đi của tốt theo màu (chỉ số color >> 3), cùng quy ước với GameState.getPawnMoves và PROMOTION_ROWS:
+# bàn cờ thường thì tốt trắng đi lên (row giảm), khi PLAYER_WANTS_TO_PLAY_AS_BLACK thì ngược lại
+PAWN_FORWARD = (8, -8) if PLAYER_WANTS_TO_PLAY_AS_BLACK else (-8, 8)
+PAWN_START_ROW = tuple(1 if forward > 0 else 6 for forward in PAWN_FORWARD)
+# Hàng tốt đứng ngay trước khi phong cấp
+PAWN_PROMOTION_ROW = tuple(PROMOTION_ROWS[color | PAWN].index(True) - forward // 8
+                           for color, forward in zip((WHITE, BLACK), PAWN_FORWARD))
+# PAWN_ATTACKS[0]: ô bị tốt trắng tấn công; PAWN_ATTACKS[1]: tốt đen
+PAWN_ATTACKS = tuple(buildStepAttacks(((forward // 8, -1), (forward // 8, 1))) for forward in PAWN_FORWARD)
+RAY_MASKS = buildRayMasks()
+
+
+def nearestBlocker(direction, blockers):
+    if POSITIVE_DIRECTION[direction]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def rayAttacks(sq, occupied, directions):
+    attacks = 0
+    for direction in directions:
+        ray = RAY_MASKS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAY_MASKS[direction][nearestBlocker(direction, blockers)]
+        attacks |= ray
+    return attacks
+
+
+def buildRelevantMasks(directions):
+    # Ô cuối mỗi tia không ảnh hưởng tới tập tấn công nên bỏ khỏi khoá tra bảng
+    masks = []
+    for sq in range(64):
+        bb = 0
+        for direction in directions:
+            ray = RAY_MASKS[direction][sq]
+            if ray:
+                farthest = ray.bit_length() - 1 if POSITIVE_DIRECTION[direction] else (ray & -ray).bit_length() - 1
+                bb |= ray & ~(1 << farthest)
+        masks.append(bb)
+    return tuple(masks)
+
+
+ROOK_RELEVANT = buildRelevantMasks(ROOK_DIRECTIONS)
+BISHOP_RELEVANT = buildRelevantMasks(BISHOP_DIRECTIONS)
+# Bảng tấn công của quân trượt theo (ô, các ô chặn liên quan), điền dần khi gặp lần đầu
+ROOK_TABLE = tuple({} for _ in range(64))
+BISHOP_TABLE = tuple({} for _ in range(64))
+
+
+def rookAttacks(sq, occupied):
+    key = occupied & ROOK_RELEVANT[sq]
+    table = ROOK_TABLE[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = rayAttacks(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+def bishopAttacks(sq, occupied):
+    key = occupied & BISHOP_RELEVANT[sq]
+    table = BISHOP_TABLE[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = rayAttacks(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def squaresOf(bb):
+    while bb:
+        lowBit = bb & -bb
+        yield lowBit.bit_length() - 1
+        bb ^= lowBit
+
+
+def shiftBitboard(bb, amount):
+    return (bb << amount) & FULL_BOARD if amount > 0 else bb >> -amount
+
+
+def pawnAttackers(targets, forward):
+    # Các ô mà tốt đi theo hướng forward đứng ở đó thì tấn công được ít nhất một ô trong targets
+    return shiftBitboard(targets & NOT_FILE_H, 1 - forward) | shiftBitboard(targets & NOT_FILE_A, -1 - forward)
+
+
+class BitboardGameState(GameState):
+    # Cùng API với GameState nhưng sinh nước đi hợp lệ trên bitboard 64 bit,
+    # mỗi loại quân của mỗi bên một số nguyên; self.squares vẫn được giữ đồng bộ
+    def __init__(self):
+        super().__init__()
+        self.syncBitboards()
+
+    @GameState.board.setter
+    def board(self, board):
+        # Bàn cờ lật của giao diện (board1) được đặt qua đây nên bitboard phải dựng lại
+        GameState.board.fset(self, board)
+        self.syncBitboards()
+
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.syncBitboards()
+
+    def syncBitboards(self):
+        self.pieceBitboards = [0] * 16
+        self.colorBitboards = [0, 0]
+        for sq, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                self.pieceBitboards[piece] |= 1 << sq
+                self.colorBitboards[piece >> 3] |= 1 << sq
+
+    def togglePiece(self, piece, sq):
+        self.pieceBitboards[piece] ^= 1 << sq
+        self.colorBitboards[piece >> 3] ^= 1 << sq
+
+    def toggleMove(self, move):
+        # XOR là phép tự nghịch đảo nên cùng một hàm dùng cho cả makeMove và undoMove
+        packed = move.packed
+        startSq = packed & 63
+        endSq = (packed >> MOVE_END_SHIFT) & 63
+        pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+        pieceCaptured = (packed >> MOVE_CAPTURED_SHIFT) & 15
+        promotionPiece = (packed >> MOVE_PROMOTION_SHIFT) & 7
+        self.togglePiece(pieceMoved, startSq)
+        if promotionPiece:
+            self.togglePiece((pieceMoved & COLOR_MASK) | promotionPiece, endSq)
+        else:
+            self.togglePiece(pieceMoved, endSq)
+        if packed & ENPASSANT_FLAG:
+            self.togglePiece(pieceCaptured, (startSq & 56) | (endSq & 7))
+        elif pieceCaptured != EMPTY:
+            self.togglePiece(pieceCaptured, endSq)
+        if packed & CASTLE_FLAG:
+            rook = (pieceMoved & COLOR_MASK) | ROOK
+            if move.endCol - move.startCol == 2:
+                self.togglePiece(rook, endSq + 1)
+                self.togglePiece(rook, endSq - 1)
+            else:
+                self.togglePiece(rook, endSq - 2)
+                self.togglePiece(rook, endSq + 1)
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            super().undoMove()
+            self.toggleMove(move)
+
+    def kingAttacked(self, kingSq, enemy, occupied, removed=0):
+        # Vua có bị chiếu trên bàn cờ occupied hay không, bỏ qua các quân địch trong removed
+        pieces = self.pieceBitboards
+        keep = ~removed
+        if rookAttacks(kingSq, occupied) & (pieces[enemy | ROOK] | pieces[enemy | QUEEN]) & keep:
+            return True
+        if bishopAttacks(kingSq, occupied) & (pieces[enemy | BISHOP] | pieces[enemy | QUEEN]) & keep:
+            return True
+        if KNIGHT_ATTACKS[kingSq] & pieces[enemy | KNIGHT] & keep:
+            return True
+        if PAWN_ATTACKS[(enemy >> 3) ^ 1][kingSq] & pieces[enemy | PAWN] & keep:
+            return True
+        return bool(KING_ATTACKS[kingSq] & pieces[enemy | KING])
+
+    def getValidMoves(self):
+        return self.generateMoves(False)
+
+    def getCaptureMoves(self):
+        # Như GameState.getCaptureMoves: khi bị chiếu vẫn sinh đủ nước thoát chiếu
+        return self.generateMoves(True)
+
+    def getPieceMoves(self, sq):
+        # Như GameState.getPieceMoves, chỉ sinh nước cho các quân nằm trong mặt nạ ô xuất phát
+        piece = self.squares[sq]
+        if piece == EMPTY or (piece & COLOR_MASK == WHITE) != self.whiteToMove:
+            return []
+        return self.generateMoves(False, 1 << sq)
+
+    def generateMoves(self, capturesOnly, fromMask=FULL_BOARD):
+        # Các vòng lặp trên bit được viết thẳng thay cho squaresOf vì đây là chỗ nóng nhất của tìm kiếm tĩnh
+        moves = []
+        pieces = self.pieceBitboards
+        squares = self.squares
+        us = WHITE if self.whiteToMove else BLACK
+        enemy = us ^ COLOR_MASK
+        own = self.colorBitboards[us >> 3]
+        enemies = self.colorBitboards[enemy >> 3]
+        occupied = own | enemies
+        kingBit = pieces[us | KING]
+        kingSq = kingBit.bit_length() - 1
+        enemyRookLike = pieces[enemy | ROOK] | pieces[enemy | QUEEN]
+        enemyBishopLike = pieces[enemy | BISHOP] | pieces[enemy | QUEEN]
+
+        # Tìm quân chiếu và quân bị ghim bằng cách dò từng tia từ vua
+        checkers = (KNIGHT_ATTACKS[kingSq] & pieces[enemy | KNIGHT]) | \
+            (PAWN_ATTACKS[us >> 3][kingSq] & pieces[enemy | PAWN])
+        checkMask = checkers
+        pinMasks = {}
+        for direction in range(8):
+            ray = RAY_MASKS[direction][kingSq]
+            blockers = ray & occupied
+            if not blockers:
+                continue
+            sliders = enemyRookLike if direction < 4 else enemyBishopLike
+            first = nearestBlocker(direction, blockers)
+            if (1 << first) & sliders:
+                checkers |= 1 << first
+                checkMask |= ray ^ RAY_MASKS[direction][first]
+            elif (1 << first) & own:
+                blockers ^= 1 << first
+                if blockers:
+                    second = nearestBlocker(direction, blockers)
+                    if (1 << second) & sliders:
+                        pinMasks[first] = ray ^ RAY_MASKS[direction][second]
+        self.inCheck = checkers != 0
+        if not self.inCheck:
+            # Khi chỉ lấy nước ăn quân, ô đích phải có quân địch
+            checkMask = enemies if capturesOnly else FULL_BOARD
+        capturesOnly = capturesOnly and not self.inCheck
+        multipleCheckers = checkers & (checkers - 1)
+
+        # Vua: chỉ kiểm tra các ô đích thật sự, ô đích không được bị tấn công khi đã nhấc vua khỏi bàn cờ
+        if kingBit & fromMask:
+            kingTargets = KING_ATTACKS[kingSq] & ~own
+            if capturesOnly:
+                kingTargets &= enemies
+            withoutKing = occupied ^ kingBit
+            while kingTargets:
+                targetBit = kingTargets & -kingTargets
+                kingTargets ^= targetBit
+                target = targetBit.bit_length() - 1
+                if not self.kingAttacked(target, enemy, withoutKing):
+                    moves.append(Move(kingSq, target, squares))
+        if multipleCheckers:
+            return self.finishValidMoves(moves) if fromMask == FULL_BOARD else moves
+
+        if not self.inCheck and not capturesOnly and kingBit & fromMask:
+            self.addCastleMoves(kingSq, occupied, enemy, moves)
+
+        targetMask = ~own & checkMask
+        knights = pieces[us | KNIGHT] & fromMask
+        while knights:
+            bit = knights & -knights
+            knights ^= bit
+            sq = bit.bit_length() - 1
+            if sq in pinMasks:
+                continue
+            targets = KNIGHT_ATTACKS[sq] & targetMask
+            while targets:
+                targetBit = targets & -targets
+                targets ^= targetBit
+                moves.append(Move(sq, targetBit.bit_length() - 1, squares))
+        sliders = (pieces[us | BISHOP] | pieces[us | ROOK] | pieces[us | QUEEN]) & fromMask
+        while sliders:
+            bit = sliders & -sliders
+            sliders ^= bit
+            sq = bit.bit_length() - 1
+            pieceType = squares[sq] & TYPE_MASK
+            if pieceType == BISHOP:
+                targets = bishopAttacks(sq, occupied)
+            elif pieceType == ROOK:
+                targets = rookAttacks(sq, occupied)
+            else:
+                targets = bishopAttacks(sq, occupied) | rookAttacks(sq, occupied)
+            targets &= targetMask
+            if sq in pinMasks:
+                targets &= pinMasks[sq]
+            while targets:
+                targetBit = targets & -targets
+                targets ^= targetBit
+                moves.append(Move(sq, targetBit.bit_length() - 1, squares))
+        self.capturesOnly = capturesOnly
+        try:
+            self.addPawnBitboardMoves(us, enemies, occupied, checkMask, pinMasks, kingSq, moves, fromMask)
+        finally:
+            self.capturesOnly = False
+        if capturesOnly:
+            self.checkmate = False
+            self.stalemate = self.fiftyMoveCounter >= 100
+            return moves
+        if fromMask != FULL_BOARD:
+            # Chỉ một phần nước đi nên không kết luận được chiếu hết hay hòa pat
+            return moves
+        return self.finishValidMoves(moves)
+
+    def addPawnBitboardMoves(self, us, enemies, occupied, checkMask, pinMasks, kingSq, moves, fromMask=FULL_BOARD):
+        squares = self.squares
+        capturesOnly = self.capturesOnly
+        color = us >> 3
+        forward = PAWN_FORWARD[color]
+        startRow = PAWN_START_ROW[color]
+        promotionRow = PAWN_PROMOTION_ROW[color]
+        attacks = PAWN_ATTACKS[color]
+        epSq = self.enpasantPossible[0] * 8 + self.enpasantPossible[1] if self.enpasantPossible else -1
+        pawns = self.pieceBitboards[us | PAWN] & fromMask
+        if capturesOnly:
+            # Nước đẩy tốt chỉ giữ lại khi phong cấp, nên ô đích không cần có quân địch.
+            # Bỏ trước các con tốt không ăn được gì và chưa tới hàng phong cấp
+            checkMask = FULL_BOARD
+            candidates = pawnAttackers(enemies, forward) | ROW_MASKS[promotionRow]
+            if epSq >= 0:
+                candidates |= PAWN_ATTACKS[color ^ 1][epSq]
+            pawns &= candidates
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            sq = bit.bit_length() - 1
+            allowed = checkMask & pinMasks[sq] if sq in pinMasks else checkMask
+            oneStep = sq + forward
+            if not (occupied >> oneStep) & 1 and (not capturesOnly or sq >> 3 == promotionRow):
+                if (allowed >> oneStep) & 1:
+                    self.addPawnMove(sq, oneStep, moves)
+                twoStep = oneStep + forward
+                if sq >> 3 == startRow and not (occupied >> twoStep) & 1 and (allowed >> twoStep) & 1:
+                    moves.append(Move(sq, twoStep, squares))
+            targets = attacks[sq] & enemies & allowed
+            while targets:
+                targetBit = targets & -targets
+                targets ^= targetBit
+                self.addPawnMove(sq, targetBit.bit_length() - 1, moves)
+            if epSq >= 0 and (attacks[sq] >> epSq) & 1:
+                # Bắt tốt qua đường: thử trực tiếp trên bitboard vì cả hai con tốt cùng rời hàng
+                capturedSq = epSq - forward
+                after = occupied ^ (1 << sq) ^ (1 << epSq) ^ (1 << capturedSq)
+                if not self.kingAttacked(kingSq, us ^ COLOR_MASK, after, 1 << capturedSq):
+                    moves.append(Move(sq, epSq, squares, isEnpassantMove=True))
+
+    def addCastleMoves(self, kingSq, occupied, enemy, moves):
+        if self.whiteToMove:
+            kingside, queenside = self.whiteCastleKingside, self.whiteCastleQueenside
+        else:
+            kingside, queenside = self.blackCastleKingside, self.blackCastleQueenside
+        if kingside and not ((1 << (kingSq + 1)) | (1 << (kingSq + 2))) & occupied \
+                and not self.kingAttacked(kingSq + 1, enemy, occupied) \
+                and not self.kingAttacked(kingSq + 2, enemy, occupied):
+            moves.append(Move(kingSq, kingSq + 2, self.squares, castle=True))
+        if queenside and not ((1 << (kingSq - 1)) | (1 << (kingSq - 2)) | (1 << (kingSq - 3))) & occupied \
+                and not self.kingAttacked(kingSq - 1, enemy, occupied) \
+                and not self.kingAttacked(kingSq - 2, enemy, occupied):
+            moves.append(Move(kingSq, kingSq - 2, self.squares, castle=True))
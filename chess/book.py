@@ -0,0 +1,221 @@
+# chess/book.py
+import mmap
+import random
+import struct
+import sys
+import time
+from .engine import newGameState, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, WHITE, BLACK, TYPE_MASK, COLOR_MASK
+from .pgn import readGames, replayGame
+
+# Mỗi mục của sách khai cuộc theo định dạng Polyglot .bin: khoá 64 bit, nước đi 16 bit, trọng số 16 bit,
+# learn 32 bit (big-endian), các mục được sắp theo khoá tăng dần
+BOOK_ENTRY = struct.Struct(">QHHI")
+BOOK_KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+POLYGLOT_PROMOTIONS = {KNIGHT: 1, BISHOP: 2, ROOK: 3, QUEEN: 4}
+RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (1, 1)}  # (trắng, đen)
+
+
+def loadPolyglotRandoms(path):
+    # Đọc 781 số ngẫu nhiên 64 bit của Polyglot (mỗi số một dòng, dạng hex) để tra sách Polyglot có sẵn
+    with open(path) as file:
+        randoms = [int(token.rstrip(','), 16) for token in file.read().split()]
+    if len(randoms) != 781:
+        raise ValueError(f"Expected 781 Polyglot random numbers in {path}, found {len(randoms)}")
+    return randoms
+
+
+def polyglotKey(gs, randoms):
+    # Khoá Polyglot: quân theo thứ tự bp, wp, bn, wn..., hàng 0 là hàng 1; ô bắt tốt qua đường chỉ tính
+    # khi bên đi có tốt đứng cạnh để bắt
+    key = 0
+    for sq, piece in enumerate(gs.squares):
+        if piece != EMPTY:
+            kind = ((piece & TYPE_MASK) - 1) * 2 + (1 if piece & COLOR_MASK == WHITE else 0)
+            key ^= randoms[64 * kind + 8 * (7 - (sq >> 3)) + (sq & 7)]
+    rights = gs.castleRightsLog[-1]
+    for index, allowed in enumerate((rights.wks, rights.wqs, rights.bks, rights.bqs)):
+        if allowed:
+            key ^= randoms[768 + index]
+    if gs.enpasantPossible:
+        row, col = gs.enpasantPossible
+        pawnRow, pawn = (row + 1, WHITE | PAWN) if gs.whiteToMove else (row - 1, BLACK | PAWN)
+        if any(0 <= c < 8 and gs.squares[pawnRow * 8 + c] == pawn for c in (col - 1, col + 1)):
+            key ^= randoms[772 + col]
+    if gs.whiteToMove:
+        key ^= randoms[780]
+    return key
+
+
+def encodeMove(move):
+    # Nước đi Polyglot: ô đến bit 0-5, ô đi bit 6-11 (hàng 0 là hàng 1), quân phong cấp bit 12-14;
+    # nhập thành ghi là vua ăn xe của mình
+    endCol = move.endCol
+    if move.castle:
+        endCol = 7 if move.endCol == 6 else 0
+    code = (7 - move.endRow) << 3 | endCol | ((7 - move.startRow) << 3 | move.startCol) << 6
+    if move.isPawnPromotion:
+        code |= POLYGLOT_PROMOTIONS[move.promotionPiece] << 12
+    return code
+
+
+def decodeMove(gs, code, validMoves=None):
+    # Nước đi hợp lệ ứng với mã Polyglot, hoặc None nếu mục trong sách không hợp lệ ở thế cờ này
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    endSq, startSq, promotion = code & 63, (code >> 6) & 63, (code >> 12) & 7
+    startRow, startCol = 7 - (startSq >> 3), startSq & 7
+    endRow, endCol = 7 - (endSq >> 3), endSq & 7
+    for move in validMoves:
+        if move.startRow != startRow or move.startCol != startCol:
+            continue
+        if move.castle:
+            if (move.endCol == 6) == (endCol == 7) and move.endRow == endRow:
+                return move
+        elif move.endRow == endRow and move.endCol == endCol and \
+                (not move.isPawnPromotion or POLYGLOT_PROMOTIONS[move.promotionPiece] == promotion):
+            return move
+    return None
+
+
+class OpeningBook:
+    # Sách khai cuộc định dạng Polyglot được ánh xạ vào bộ nhớ (mmap) và tìm nhị phân theo khoá,
+    # không đọc mục nào thành đối tượng Python trừ các nước của thế cờ đang tra.
+    # Mặc định khoá là gs.zobristKey (sách tạo bằng buildBook); truyền randoms để dùng sách Polyglot có sẵn
+    def __init__(self, path, seed=None, randoms=None):
+        self.path = path
+        self.random = random.Random(seed)
+        self.randoms = randoms
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.data = b""  # file rỗng không mmap được
+        self.entryCount = len(self.data) // BOOK_ENTRY.size
+        self.hits = 0
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def key(self, gs):
+        return polyglotKey(gs, self.randoms) if self.randoms is not None else gs.zobristKey
+
+    def findEntries(self, key):
+        # Tìm nhị phân mục đầu tiên có khoá key, rồi đọc các mục liền sau cùng khoá: [(mã nước, trọng số)]
+        low, high = 0, self.entryCount
+        while low < high:
+            middle = (low + high) // 2
+            if BOOK_KEY.unpack_from(self.data, middle * BOOK_ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.entryCount:
+            entryKey, code, weight, _ = BOOK_ENTRY.unpack_from(self.data, low * BOOK_ENTRY.size)
+            if entryKey != key:
+                break
+            entries.append((code, weight))
+            low += 1
+        return entries
+
+    def getMoves(self, gs, validMoves=None):
+        # Các nước trong sách cho thế cờ hiện tại: [(Move, trọng số)], bỏ mục không hợp lệ
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        moves = []
+        for code, weight in self.findEntries(self.key(gs)):
+            move = decodeMove(gs, code, validMoves)
+            if move is not None:
+                moves.append((move, weight))
+        return moves
+
+    def pickMove(self, gs, validMoves=None):
+        # Chọn ngẫu nhiên theo trọng số (dùng self.random có seed); None nếu thế cờ không có trong sách
+        moves = [(move, weight) for move, weight in self.getMoves(gs, validMoves) if weight > 0]
+        if not moves:
+            return None
+        self.hits += 1
+        pick = self.random.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            if pick < weight:
+                return move
+            pick -= weight
+
+
+def buildBook(pgnPaths, outputPath, maxPly=16, minGames=1, backend="mailbox", out=sys.stderr):
+    # Đọc lần lượt từng ván trong các file PGN và ghi sách: mỗi nước trong maxPly nửa nước đầu được cộng
+    # 2 điểm khi bên đi thắng, 1 khi hoà; chỉ giữ nước xuất hiện ít nhất minGames ván
+    weights = {}
+    counts = {}
+    games = skipped = 0
+    start = time.perf_counter()
+    for path in pgnPaths:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for headers, sanMoves, result in readGames(file):
+                if "FEN" in headers or not sanMoves:
+                    skipped += 1
+                    continue
+                games += 1
+                points = RESULT_POINTS.get(result, (1, 1))
+                gs = newGameState(backend)
+                try:
+                    for move in replayGame(gs, sanMoves[:maxPly]):
+                        entry = (gs.zobristKey, encodeMove(move))
+                        weights[entry] = weights.get(entry, 0) + points[0 if gs.whiteToMove else 1]
+                        counts[entry] = counts.get(entry, 0) + 1
+                except ValueError as error:
+                    out.write(f"game {games}: {error}, skipping the rest of the game\n")
+                if games % 1000 == 0:
+                    out.write(f"{games} games, {len(weights)} entries, "
+                              f"{games / (time.perf_counter() - start):.0f} games/s\n")
+
+    entries = [(key, code, weight) for (key, code), weight in weights.items() if counts[(key, code)] >= minGames]
+    # Trọng số lớn được thu nhỏ cùng tỉ lệ cho vừa 16 bit; nước đã chơi không bao giờ về 0 trừ khi luôn thua
+    scale = max([weight for _, _, weight in entries] + [MAX_WEIGHT]) / MAX_WEIGHT
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(outputPath, "wb") as file:
+        for key, code, weight in entries:
+            file.write(BOOK_ENTRY.pack(key, code, min(MAX_WEIGHT, max(1, round(weight / scale)) if weight else 0), 0))
+    out.write(f"{games} games ({skipped} skipped), {len(entries)} entries, "
+              f"{games / max(time.perf_counter() - start, 1e-9):.0f} games/s -> {outputPath}\n")
+    return len(entries)
+
+
+def main(argv=None):
+    import argparse  # chỉ cần cho dòng lệnh; module này được chessAi nhập lúc khởi động
+    parser = argparse.ArgumentParser(prog="python -m chess.book", description="Build or query an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn", nargs="+", help="PGN files, read one game at a time")
+    build.add_argument("-o", "--output", required=True, help="book file to write")
+    build.add_argument("--plies", type=int, default=16, help="number of half-moves per game to record")
+    build.add_argument("--min-games", type=int, default=1, help="drop moves seen in fewer games")
+    probe = commands.add_parser("probe", help="list the book moves for a position")
+    probe.add_argument("book")
+    probe.add_argument("--fen", help="position to look up (default: start position)")
+    probe.add_argument("--polyglot-randoms", help="file with the 781 Polyglot random numbers, for third-party books")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        buildBook(args.pgn, args.output, args.plies, args.min_games)
+        return 0
+    try:
+        gs = newGameState("mailbox", args.fen)
+        randoms = loadPolyglotRandoms(args.polyglot_randoms) if args.polyglot_randoms else None
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    book = OpeningBook(args.book, randoms=randoms)
+    moves = book.getMoves(gs)
+    total = sum(weight for _, weight in moves) or 1
+    for move, weight in moves:
+        print(f"{move.getUciNotation():6} weight {weight:5d}  {100 * weight / total:5.1f}%")
+    if not moves:
+        print("position not in book")
+    book.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
 # chess/chessAi.py
+import atexit
 import random
-from .engine import GameState
+import time
+from .bitbase import Bitbases
+from .book import OpeningBook
+from .transposition import TranspositionTable, PawnHashTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from .engine import MOVE_PROMOTION_SHIFT, MOVE_PIECE_SHIFT, MOVE_CAPTURED_SHIFT
+from .engine import setEvalTables, RAYS, KNIGHT_TARGETS, PLAYER_WANTS_TO_PLAY_AS_BLACK
+from .engine import GameState, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, TYPE_MASK, COLOR_MASK
 
 # Định nghĩa giá trị quân cờ
-pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
+pieceScore = {KING: 0, QUEEN: 9, ROOK: 5, BISHOP: 3, KNIGHT: 3, PAWN: 1}
 
 EXTENDED_CENTER_SQUARES = [(2, 2), (2, 3), (2, 4), (2, 5), (3, 2), (3, 5), (4, 2), (4, 5), (5, 2), (5, 3), (5, 4), (5, 5)]
 
@@ -62,136 +69,521 @@ blackPawnScores = [[0, 0, 0, 0, 0, 0, 0, 0],
                    [8, 8, 8, 8, 8, 8, 8, 8],
                    [8, 8, 8, 8, 8, 8, 8, 8]]
 
-piecePositionScores = {"N": knightScores, "B": bishopScores, "Q": queenScores,
-                       "R": rookScores, "wp": whitePawnScores, "bp": blackPawnScores}
+piecePositionScores = {KNIGHT: knightScores, BISHOP: bishopScores, QUEEN: queenScores,
+                       ROOK: rookScores, WHITE | PAWN: whitePawnScores, BLACK | PAWN: blackPawnScores}
 
 CHECKMATE = 1000
 STALEMATE = 0
-DEPTH = 4
+DEPTH = 4  # Độ sâu khi tìm không giới hạn thời gian
+MAX_DEPTH = 64  # Độ sâu tối đa khi tìm theo thời gian
+TIME_LIMIT = 3.0  # Số giây suy nghĩ mặc định cho mỗi nước; None để tìm cố định DEPTH
+TIME_CHECK_INTERVAL = 32  # Số nút giữa hai lần xem đồng hồ
+HASH_SIZE_MB = 16  # Bộ nhớ cho bảng chuyển vị
+THREADS = 1  # Số tiến trình tìm kiếm song song (Lazy SMP); 1 là tìm tuần tự như cũ
+HELPER_JOIN_TIMEOUT = 2.0  # Số giây chờ tiến trình phụ dừng trước khi buộc kết thúc
+MAX_PLY = 128
+# Bị chiếu hết sau ply nửa nước tính từ gốc có điểm -(CHECKMATE - ply), nên chiếu hết càng gần càng được ưu tiên;
+# điểm có trị tuyệt đối trên MATE_BOUND là điểm chiếu hết
+MATE_BOUND = CHECKMATE - MAX_PLY
+
+transpositionTable = TranspositionTable(HASH_SIZE_MB)
+pawnHashTable = PawnHashTable()
+bitbases = Bitbases()  # Bảng tàn cuộc KPK/KRK/KQK đã tạo bằng python -m chess.bitbase generate (nếu có)
+BITBASE_MATERIAL = (pieceScore[PAWN], pieceScore[ROOK], pieceScore[QUEEN])  # gs.material của Vua + một quân đối Vua
+BITBASE_WIN = CHECKMATE / 2  # Thấp hơn chiếu hết để nước chiếu hết thấy được vẫn được ưu tiên
+openingBook = None  # OpeningBook được tra trước khi tìm kiếm, đặt bằng setOpeningBook
+searchStopEvent = None  # multiprocessing.Event báo tiến trình tìm kiếm dừng sớm
+searchPonderHit = None  # Event khi đang suy nghĩ trước (ponder): được đặt lúc đối thủ đi đúng nước đoán
+helperNodesSearched = 0  # Tổng số nút các tiến trình phụ đã duyệt ở lần tìm song song gần nhất
+
+# Sắp xếp nước đi: hai nước sát thủ (killer) mỗi tầng và bảng lịch sử theo ô đi - ô đến
+killerMoves = [[0, 0] for _ in range(MAX_PLY)]
+historyTable = [0] * 4096
+HISTORY_LIMIT = 1000000
+PV_ORDER = 4000000
+HASH_ORDER = 3000000
+CAPTURE_ORDER = 2000000
+KILLER_ORDER = (1500000, 1400000)
+DELTA_MARGIN = 2  # Bỏ nước ăn quân khi cả giá trị quân bị ăn cộng biên này vẫn không tới alpha
 
 # Định nghĩa các ô trung tâm (d4, d5, e4, e5)
 CENTER_SQUARES = [(3, 3), (3, 4), (4, 3), (4, 4)]
 
+# Hướng trong RAYS của từng quân trượt khi đếm tính di động
+MOBILITY_DIRECTIONS = {BISHOP: (4, 5, 6, 7), ROOK: (0, 1, 2, 3), QUEEN: (0, 1, 2, 3, 4, 5, 6, 7)}
+MOBILITY_WEIGHT = 0.1
+
+# Điểm quân + vị trí được GameState cộng dồn theo từng nước, tính bằng phần nghìn con tốt
+EVAL_SCALE = 1000
+
+def buildEvalTables():
+    # Gộp giá trị quân, điểm vị trí và điểm kiểm soát trung tâm của mỗi quân trên mỗi ô vào một bảng
+    materialValues = [0] * 16
+    pieceSquareValues = [[0] * 64 for _ in range(16)]
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            piece = color | pieceType
+            materialValues[piece] = pieceScore[pieceType]
+            if pieceType == PAWN:
+                # Khi lật bàn cờ tốt trắng tiến về hàng 7 nên dùng bảng của tốt đen và ngược lại
+                pawnColor = color ^ BLACK if PLAYER_WANTS_TO_PLAY_AS_BLACK else color
+                positionScores = piecePositionScores[pawnColor | PAWN]
+            else:
+                positionScores = piecePositionScores.get(pieceType)
+            for sq in range(64):
+                row = sq >> 3
+                col = sq & 7
+                value = pieceScore[pieceType]
+                if positionScores is not None:
+                    value += positionScores[row][col] * 0.1
+                if (row, col) in CENTER_SQUARES:
+                    value += pieceScore[pieceType] * 0.1
+                if (row, col) in EXTENDED_CENTER_SQUARES:
+                    value += pieceScore[pieceType] / 2 * 0.05
+                pieceSquareValues[piece][sq] = sign * round(value * EVAL_SCALE)
+    return materialValues, pieceSquareValues
+
+setEvalTables(*buildEvalTables())
+
 def findRandomMoves(validMoves):
     return validMoves[random.randint(0, len(validMoves) - 1)]
 
-def findBestMove(gs, validMoves, returnQueue):
-    global nextMove, whitePawnScores, blackPawnScores
-    nextMove = None
-    random.shuffle(validMoves)
+def allocateTime(timeLeft, increment=0, movesToGo=None):
+    # Chia thời gian còn lại trên đồng hồ cho nước hiện tại, luôn chừa lại một khoảng dự phòng
+    movesToGo = movesToGo or 30
+    budget = timeLeft / movesToGo + increment * 0.8
+    return max(0.05, min(budget, timeLeft * 0.5))
+
+def newGame():
+    # Xoá mọi thông tin học được từ ván trước (bảng chuyển vị, bảng tốt, nước sát thủ, lịch sử)
+    transpositionTable.clear()
+    pawnHashTable.clear()
+    for killers in killerMoves:
+        killers[0] = killers[1] = 0
+    historyTable[:] = [0] * 4096
+
+def setOpeningBook(path, seed=None):
+    # Dùng sách khai cuộc ở path (None để tắt); seed cố định cho các lần chọn nước lặp lại được
+    global openingBook
+    if openingBook is not None:
+        openingBook.close()
+    openingBook = OpeningBook(path, seed) if path is not None else None
+
+def findBestMove(gs, validMoves, returnQueue, timeLimit=TIME_LIMIT, maxDepth=None, timeLeft=None, increment=0,
+                 movesToGo=None, nodeLimit=None, shuffle=True, onIteration=None, threads=None, stopEvent=None, ponderHit=None,
+                 useBook=True):
+    # stopEvent (multiprocessing.Event hoặc threading.Event): khi được đặt, tìm kiếm dừng trong vài mili giây
+    # và trả về nước tốt nhất đã tìm được. ponderHit: tìm không giới hạn thời gian cho tới khi event này
+    # được đặt, từ đó timeLimit mới có hiệu lực và được tính cả thời gian đã suy nghĩ trước.
+    # timeLeft/increment/movesToGo: đồng hồ của bên đi, movesToGo là số nước còn phải đi tới lần cộng giờ sau
+    global searchStopEvent, searchPonderHit, lastSearchInfo, nodesSearched
+    searchStopEvent = stopEvent
+    searchPonderHit = ponderHit
+    # Thế cờ có trong sách khai cuộc thì đi ngay, lastSearchInfo["book"] cho biết nước lấy từ sách
+    if useBook and openingBook is not None and ponderHit is None:
+        bookMove = openingBook.pickMove(gs, validMoves)
+        if bookMove is not None:
+            nodesSearched = 0
+            lastSearchInfo = {"depth": 0, "score": 0, "pv": [bookMove], "nodes": 0, "time": 0.0, "book": True}
+            returnQueue.put(bookMove)
+            return
+    # Xáo trộn để máy không đi y hệt nhau mỗi ván; tắt đi khi cần kết quả lặp lại được (benchmark)
+    if shuffle:
+        random.shuffle(validMoves)
+
+    if timeLeft is not None:
+        clockLimit = allocateTime(timeLeft, increment, movesToGo)
+        timeLimit = clockLimit if timeLimit is None else min(timeLimit, clockLimit)
+    if maxDepth is None:
+        maxDepth = MAX_DEPTH if timeLimit is not None or nodeLimit is not None else DEPTH
+    threads = THREADS if threads is None else threads
+    if threads > 1:
+        returnQueue.put(parallelSearchMove(gs, validMoves, threads, timeLimit, maxDepth, onIteration, nodeLimit))
+    else:
+        transpositionTable.newSearch()
+        returnQueue.put(searchMove(gs, validMoves, timeLimit, maxDepth, onIteration, nodeLimit))
 
-    if gs.playerWantsToPlayAsBlack:
-        whitePawnScores, blackPawnScores = blackPawnScores, whitePawnScores
+def parallelSearchMove(gs, validMoves, threads, timeLimit=None, maxDepth=DEPTH, onIteration=None, nodeLimit=None):
+    # Lazy SMP: threads - 1 tiến trình phụ cùng tìm từ gốc với thứ tự nước và độ sâu hơi khác nhau,
+    # chỉ chia sẻ bảng chuyển vị đặt trong bộ nhớ chung. Nước đi lấy từ tiến trình chính
+    global transpositionTable, helperNodesSearched
+    import multiprocessing  # chỉ nhập khi tìm song song, giữ cho lúc khởi động nhanh
+    if not transpositionTable.shared:
+        transpositionTable = TranspositionTable(transpositionTable.sizeMB, shared=True)
+        atexit.register(transpositionTable.close)
+    transpositionTable.newSearch()
+    stopEvent = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    helpers = []
+    for workerIndex in range(1, threads):
+        helper = multiprocessing.Process(target=lazySmpWorker, daemon=True,
+                                         args=(gs, validMoves, workerIndex, transpositionTable.sharedName,
+                                               transpositionTable.sizeMB, transpositionTable.generation, stopEvent,
+                                               results, timeLimit, maxDepth, nodeLimit))
+        helper.start()
+        helpers.append(helper)
 
+    try:
+        bestMove = searchMove(gs, validMoves, timeLimit, maxDepth, onIteration, nodeLimit)
+    finally:
+        stopEvent.set()
+        helperNodesSearched = 0
+        for _ in helpers:
+            try:
+                helperNodesSearched += results.get(timeout=HELPER_JOIN_TIMEOUT)
+            except Exception:
+                break
+        for helper in helpers:
+            helper.join(HELPER_JOIN_TIMEOUT)
+            if helper.is_alive():
+                helper.terminate()
+    return bestMove
+
+def lazySmpWorker(gs, validMoves, workerIndex, tableName, sizeMB, generation, stopEvent, results, timeLimit,
+                  maxDepth, nodeLimit):
+    # Tiến trình phụ: gắn vào bảng chung rồi tìm cho tới khi tiến trình chính báo dừng.
+    # Giới hạn thời gian và số nút vẫn giữ để tiến trình không chạy mãi nếu tiến trình chính bị giết
+    global transpositionTable, searchStopEvent
+    transpositionTable = TranspositionTable.attach(tableName, sizeMB)
+    transpositionTable.generation = generation
+    searchStopEvent = stopEvent
+    validMoves = list(validMoves)
+    random.Random(workerIndex).shuffle(validMoves)
+    try:
+        searchMove(gs, validMoves, timeLimit, maxDepth + workerIndex % 2, None, nodeLimit)
+    finally:
+        results.put(nodesSearched)
+        transpositionTable.close()
+
+def searchMove(gs, validMoves, timeLimit=None, maxDepth=DEPTH, onIteration=None, nodeLimit=None):
+    # Tìm sâu dần 1, 2, 3... cho tới maxDepth, hết timeLimit giây hoặc quá nodeLimit nút; trả về nước
+    # tốt nhất của lần lặp hoàn chỉnh cuối cùng. Biến chính của lần trước được thử trước ở lần sau
+    global nextMove, nodesSearched, searchStopped, searchDeadline, searchNodeLimit, searchRootPly, pvTable, previousPV, \
+        lastSearchInfo, searchStartTime, searchTimeLimit
+    startTime = time.perf_counter()
+    searchStartTime = startTime
+    searchTimeLimit = timeLimit
+    nodesSearched = 0
+    searchStopped = False
+    searchDeadline = None  # độ sâu 1 luôn được tìm xong
+    searchNodeLimit = None
+    searchRootPly = len(gs.moveLog)
+    previousPV = []
+    bestMove = validMoves[0] if validMoves else None
+    lastSearchInfo = {"depth": 0, "score": 0, "pv": [], "nodes": 0, "time": 0.0, "book": False}
     turnMultiplier = 1 if gs.whiteToMove else -1
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, turnMultiplier)
-    returnQueue.put(nextMove)
+    resetOrdering()
+
+    for depth in range(1, maxDepth + 1):
+        nextMove = None
+        pvTable = [[] for _ in range(depth + 2)]
+        score = findMoveNegaMaxAlphaBeta(gs, validMoves, depth, -CHECKMATE, CHECKMATE, turnMultiplier)
+        elapsed = time.perf_counter() - startTime
+        if searchStopped:
+            # Nước gốc đã duyệt xong ở lần lặp dở chỉ thay được nước biến chính (duyệt đầu tiên) khi tốt hơn nó
+            if nextMove is not None:
+                bestMove = nextMove
+            break
+        if nextMove is not None:
+            bestMove = nextMove
+        previousPV = pvTable[0]
+        lastSearchInfo = {"depth": depth, "score": score, "pv": previousPV, "nodes": nodesSearched, "time": elapsed,
+                          "book": False}
+        if onIteration is not None:
+            onIteration(lastSearchInfo)
+        pondering = searchPonderHit is not None and not searchPonderHit.is_set()
+        if timeLimit is not None and not pondering:
+            # Lần lặp sau thường tốn gấp vài lần lần này, không bắt đầu nếu đã dùng quá nửa thời gian
+            if elapsed >= timeLimit * 0.5:
+                break
+            searchDeadline = startTime + timeLimit
+        if nodeLimit is not None:
+            if nodesSearched >= nodeLimit:
+                break
+            searchNodeLimit = nodeLimit
+    return bestMove
+
+def mateDistance(score):
+    # Số nước tới chiếu hết suy ra từ điểm: dương khi bên đi chiếu hết, âm khi bị chiếu hết;
+    # None nếu không phải điểm chiếu hết
+    if abs(score) <= MATE_BOUND:
+        return None
+    moves = (round(CHECKMATE - abs(score)) + 1) // 2
+    return moves if score > 0 else -moves
+
+def scoreToTable(score, ply):
+    # Bảng chuyển vị lưu khoảng cách chiếu hết tính từ thế cờ được lưu chứ không phải từ gốc
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+def findPonderMove(gs, bestMove):
+    # Nước đoán đối thủ sẽ trả lời bestMove: nước thứ hai của biến chính, hoặc nước lưu trong bảng chuyển vị
+    # khi biến chính bị cắt ngắn (điểm lấy thẳng từ bảng ở tầng 1)
+    pv = lastSearchInfo["pv"]
+    if len(pv) > 1 and pv[0].moveID == bestMove.moveID:
+        return pv[1]
+    gs.makeMove(bestMove)
+    entry = transpositionTable.probe(gs.zobristKey)
+    ponderMove = None
+    if entry is not None and entry[3]:
+        ponderMove = next((move for move in gs.getValidMoves() if move.moveID == entry[3]), None)
+    gs.undoMove()
+    return ponderMove
+
+def checkSearchLimits():
+    # Gọi sau mỗi TIME_CHECK_INTERVAL nút: dừng tìm kiếm khi hết giờ hoặc vượt số nút cho phép
+    global searchStopped, searchDeadline
+    if searchDeadline is None and searchPonderHit is not None and searchTimeLimit is not None \
+            and searchPonderHit.is_set():
+        # Đối thủ vừa đi đúng nước đoán: thời gian suy nghĩ trước được tính vào thời gian của nước này
+        searchDeadline = searchStartTime + searchTimeLimit
+    if searchDeadline is not None and time.perf_counter() >= searchDeadline:
+        searchStopped = True
+    if searchNodeLimit is not None and nodesSearched >= searchNodeLimit:
+        searchStopped = True
+    if searchStopEvent is not None and searchStopEvent.is_set():
+        searchStopped = True
+
+def resetOrdering():
+    # Nước sát thủ chỉ đúng với thế cờ vừa tìm; lịch sử được giảm một nửa thay vì xoá hẳn
+    for killers in killerMoves:
+        killers[0] = killers[1] = 0
+    for i in range(4096):
+        historyTable[i] >>= 1
+
+def orderMoves(validMoves, ply, pvMoveID=0, hashMoveID=0):
+    return sorted(validMoves, key=moveOrderKey(ply, pvMoveID, hashMoveID), reverse=True)
+
+def moveOrderKey(ply, pvMoveID=0, hashMoveID=0):
+    # Nước biến chính, nước trong bảng, ăn quân theo MVV-LVA, nước sát thủ rồi nước yên tĩnh theo lịch sử
+    killer1, killer2 = killerMoves[ply]
+
+    def orderKey(move):
+        moveID = move.moveID
+        if moveID == pvMoveID:
+            return PV_ORDER
+        if moveID == hashMoveID:
+            return HASH_ORDER
+        packed = move.packed
+        captured = (packed >> MOVE_CAPTURED_SHIFT) & TYPE_MASK
+        promotion = (packed >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+        if captured or promotion:
+            # Quân bị ăn giá trị nhất trước, cùng quân bị ăn thì quân ăn rẻ nhất trước
+            gain = pieceScore[captured] if captured else 0
+            if promotion:
+                gain += pieceScore[promotion] - pieceScore[PAWN]
+            return CAPTURE_ORDER + gain * 100 - ((packed >> MOVE_PIECE_SHIFT) & TYPE_MASK)
+        if moveID == killer1:
+            return KILLER_ORDER[0]
+        if moveID == killer2:
+            return KILLER_ORDER[1]
+        return historyTable[moveID & 4095]
+
+    return orderKey
+
+def updateOrdering(move, ply, depth):
+    # Nước yên tĩnh gây cắt beta được ghi nhớ làm nước sát thủ và cộng điểm lịch sử
+    packed = move.packed
+    if (packed >> MOVE_CAPTURED_SHIFT) & TYPE_MASK or (packed >> MOVE_PROMOTION_SHIFT) & TYPE_MASK:
+        return
+    killers = killerMoves[ply]
+    if killers[0] != move.moveID:
+        killers[1] = killers[0]
+        killers[0] = move.moveID
+    index = move.moveID & 4095
+    historyTable[index] += depth * depth
+    if historyTable[index] > HISTORY_LIMIT:
+        for i in range(4096):
+            historyTable[i] >>= 1
 
 def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
+    global nextMove, nodesSearched
+    nodesSearched += 1
+    if nodesSearched % TIME_CHECK_INTERVAL == 0:
+        checkSearchLimits()
+    if searchStopped:
+        return 0
+    ply = len(gs.moveLog) - searchRootPly
+    pvTable[ply] = []
+    # Thế cờ đã gặp trên đường đi hoặc trong ván: tính hoà, vì bên thấy có lợi khi lặp lại có thể lặp tiếp
+    # tới lần thứ ba. Không lưu vào bảng chuyển vị vì điểm này phụ thuộc đường đi
+    if ply != 0 and gs.fiftyMoveCounter >= 4 and gs.repetitionCount() > 1:
+        return STALEMATE
+    # Tàn cuộc có trong bảng: thế hoà trả về ngay; thế thắng/thua vẫn được tìm tiếp để thấy nước chiếu hết,
+    # chỉ ở lá mới dùng điểm của bảng thay cho tìm kiếm tĩnh (ở gốc vẫn tìm để chọn nước)
+    if ply != 0 and gs.material in BITBASE_MATERIAL and gs.fiftyMoveCounter < 100:
+        result = bitbases.probe(gs)
+        if result == 0 or (result is not None and depth == 0):
+            return scoreBitbaseResult(gs, result)
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
+        return quiescenceSearch(gs, alpha, beta, turnMultiplier)
+    if ply != 0 and gs.fiftyMoveCounter >= 100:
+        return STALEMATE
+
+    # Tra bảng chuyển vị; ở gốc vẫn phải duyệt để chọn được nextMove
+    alphaOriginal = alpha
+    hashMoveID = 0
+    entry = transpositionTable.probe(gs.zobristKey)
+    if entry is not None:
+        entryDepth, entryScore, entryBound, hashMoveID = entry
+        entryScore = scoreFromTable(entryScore, ply)
+        if entryDepth >= depth and ply != 0:
+            if entryBound == EXACT:
+                return entryScore
+            if entryBound == LOWER_BOUND:
+                alpha = max(alpha, entryScore)
+            elif entryBound == UPPER_BOUND:
+                beta = min(beta, entryScore)
+            if alpha >= beta:
+                return entryScore
+
+    # Nước của biến chính lần lặp trước (nếu vẫn đang đi theo nó) rồi tới nước trong bảng được thử trước
+    pvMoveID = 0
+    if ply < len(previousPV) and gs.moveLog[searchRootPly:] == previousPV[:ply]:
+        pvMoveID = previousPV[ply].moveID
+    # Ở gốc dùng danh sách có sẵn; các nút khác sinh nước theo giai đoạn để cắt beta sớm đỡ phải sinh hết
+    if validMoves is None:
+        moves = gs.getStagedMoves((pvMoveID, hashMoveID), killerMoves[ply], moveOrderKey(ply, pvMoveID, hashMoveID))
+    else:
+        moves = orderMoves(validMoves, ply, pvMoveID, hashMoveID)
 
     maxScore = -CHECKMATE
-    for move in validMoves:
+    bestMoveID = 0
+    moveCount = 0
+    for move in moves:
+        moveCount += 1
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMultiplier)
+        score = -findMoveNegaMaxAlphaBeta(gs, None, depth-1, -beta, -alpha, -turnMultiplier)
+        gs.undoMove()
+        if searchStopped:
+            return 0
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
+            bestMoveID = move.moveID
+            if ply == 0:
                 nextMove = move
-        gs.undoMove()
+            if score > alpha:
+                pvTable[ply] = [move] + pvTable[ply + 1]
         if maxScore > alpha:
             alpha = maxScore
         if alpha >= beta:
+            updateOrdering(move, ply, depth)
             break
+    if moveCount == 0:
+        # Không còn nước đi: cờ checkmate/stalemate đã được đặt khi sinh nước
+        maxScore = -(CHECKMATE - ply) if gs.checkmate else STALEMATE
+
+    if maxScore <= alphaOriginal:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transpositionTable.store(gs.zobristKey, depth, scoreToTable(maxScore, ply), bound, bestMoveID)
     return maxScore
 
-def scoreBoard(gs):
+def scoreBitbaseResult(gs, result):
+    # Điểm theo bên đi cho kết quả bảng tàn cuộc. Thế thắng được cộng thêm điểm tiến triển (dồn Vua yếu
+    # ra mép, hai Vua lại gần, đẩy tốt) để máy tiến tới chiếu hết thay vì đi loanh quanh tới luật 50 nước
+    if result == 0:
+        return STALEMATE
+    kings = [0, 0]
+    pieceSq = piece = 0
+    for sq, value in enumerate(gs.squares):
+        if value & TYPE_MASK == KING:
+            kings[value >> 3] = sq
+        elif value != EMPTY:
+            pieceSq, piece = sq, value
+    strongColor = (piece & COLOR_MASK) >> 3
+    strongRow, strongCol = divmod(kings[strongColor], 8)
+    weakRow, weakCol = divmod(kings[1 - strongColor], 8)
+    if piece & TYPE_MASK == PAWN:
+        pawnRow = pieceSq >> 3
+        progress = (6 - pawnRow if strongColor == 0 else pawnRow - 1) * 0.1
+    else:
+        edgeDistance = max(3 - weakRow, weakRow - 4) + max(3 - weakCol, weakCol - 4)
+        progress = edgeDistance * 0.1 + (14 - abs(strongRow - weakRow) - abs(strongCol - weakCol)) * 0.05
+    score = BITBASE_WIN + progress
+    return score if result == 1 else -score
+
+def quiescenceSearch(gs, alpha, beta, turnMultiplier):
+    # Ở chân trời chỉ tiếp tục các nước ăn quân (hoặc thoát chiếu) cho tới khi thế cờ yên tĩnh
+    global nodesSearched
+    nodesSearched += 1
+    if nodesSearched % TIME_CHECK_INTERVAL == 0:
+        checkSearchLimits()
+    if searchStopped:
+        return 0
+    moves = gs.getCaptureMoves()
+    inCheck = gs.inCheck
+    ply = len(gs.moveLog) - searchRootPly
     if gs.checkmate:
-        if gs.whiteToMove:
-            gs.checkmate = False
-            return -CHECKMATE
-        else:
-            gs.checkmate = False
-            return CHECKMATE
-    elif gs.stalemate:
+        return -(CHECKMATE - ply)
+    if gs.stalemate:
         return STALEMATE
 
-    # Tính giai đoạn ván cờ (0: mở đầu, 1: trung cuộc, 2: tàn cuộc)
-    total_material = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--" and square[1] != "K":
-                total_material += pieceScore[square[1]]
-    game_phase = 0  # Mở đầu
-    if total_material < 40:
-        game_phase = 1  # Trung cuộc
-    if total_material < 20:
-        game_phase = 2  # Tàn cuộc
+    if inCheck:
+        # Đang bị chiếu thì không được đứng yên, phải xét mọi nước thoát chiếu
+        maxScore = -CHECKMATE
+        standPat = None
+    else:
+        standPat = turnMultiplier * scoreBoard(gs)
+        if standPat >= beta or ply >= MAX_PLY - 1:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        maxScore = standPat
 
-    score = 0
-    center_control = {"w": 0, "b": 0}
-    extended_center_control = {"w": 0, "b": 0}
-    pawn_structure = {"w": 0, "b": 0}
-    king_safety = {"w": 0, "b": 0}
-    mobility = {"w": 0, "b": 0}
-    piece_coordination = {"w": 0, "b": 0}
+    for move in orderMoves(moves, ply):
+        if standPat is not None:
+            packed = move.packed
+            captured = (packed >> MOVE_CAPTURED_SHIFT) & TYPE_MASK
+            promotion = (packed >> MOVE_PROMOTION_SHIFT) & TYPE_MASK
+            gain = pieceScore[captured] if captured else 0
+            if promotion:
+                gain += pieceScore[promotion] - pieceScore[PAWN]
+            if standPat + gain + DELTA_MARGIN <= alpha:
+                continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turnMultiplier)
+        gs.undoMove()
+        if searchStopped:
+            return 0
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
+        if alpha >= beta:
+            break
+    return maxScore
 
-    # Lưu trữ vị trí các tốt
+def evaluatePawnStructure(squares):
+    # Trả về (điểm tốt cô lập/liên kết, hiệu số cột có tốt thông trắng - đen, mặt nạ bit các cột mở).
+    # Điểm tốt thông phụ thuộc giai đoạn ván cờ nên scoreBoard nhân sau
+    pawn_structure = {"w": 0, "b": 0}
+    passed = {"w": 0, "b": 0}
     white_pawns = [[] for _ in range(8)]
     black_pawns = [[] for _ in range(8)]
-    # Đếm số Tượng để tính điểm đôi Tượng
-    white_bishops = 0
-    black_bishops = 0
-    # Đếm số quân trên các cột để tính cột mở
-    pieces_on_files = [[] for _ in range(8)]
-
-    # Tính giá trị vật chất và các yếu tố khác
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                piecePositionScore = 0
-                if square[1] != "K":
-                    if square[1] == "p":
-                        piecePositionScore = piecePositionScores[square][row][col]
-                        if square[0] == 'w':
-                            white_pawns[col].append(row)
-                        else:
-                            black_pawns[col].append(row)
-                    else:
-                        piecePositionScore = piecePositionScores[square[1]][row][col]
-                        if square[1] == "B":
-                            if square[0] == 'w':
-                                white_bishops += 1
-                            else:
-                                black_bishops += 1
-                if square[1] != "K":
-                    pieces_on_files[col].append(square)
-
-                # Kiểm soát trung tâm
-                if (row, col) in CENTER_SQUARES:
-                    weight = pieceScore[square[1]]
-                    center_control[square[0]] += weight
-                if (row, col) in EXTENDED_CENTER_SQUARES:
-                    weight = pieceScore[square[1]]
-                    extended_center_control[square[0]] += weight / 2
-
-                # Tính điểm vật chất và vị trí
-                if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * 0.1
-                elif square[0] == 'b':
-                    score -= pieceScore[square[1]] + piecePositionScore * 0.1
-
-    # Điểm thưởng cho kiểm soát trung tâm
-    score += (center_control["w"] - center_control["b"]) * 0.1
-    score += (extended_center_control["w"] - extended_center_control["b"]) * 0.05
+    for sq in range(64):
+        if squares[sq] == WHITE | PAWN:
+            white_pawns[sq & 7].append(sq >> 3)
+        elif squares[sq] == BLACK | PAWN:
+            black_pawns[sq & 7].append(sq >> 3)
 
-    # Đánh giá cấu trúc tốt
+    openFiles = 0
     for col in range(8):
+        if not white_pawns[col] and not black_pawns[col]:
+            openFiles |= 1 << col
         # Tốt trắng
         if white_pawns[col]:
             # Tốt cô lập
@@ -212,7 +604,7 @@ def scoreBoard(gs):
                     is_passed = False
                     break
             if is_passed:
-                pawn_structure["w"] += 1.0 if game_phase == 2 else 0.5
+                passed["w"] += 1
         # Tốt đen
         if black_pawns[col]:
             if col > 0 and not black_pawns[col-1] and col < 7 and not black_pawns[col+1]:
@@ -231,8 +623,80 @@ def scoreBoard(gs):
                     is_passed = False
                     break
             if is_passed:
-                pawn_structure["b"] += 1.0 if game_phase == 2 else 0.5
-    score += (pawn_structure["w"] - pawn_structure["b"])
+                passed["b"] += 1
+    return pawn_structure["w"] - pawn_structure["b"], passed["w"] - passed["b"], openFiles
+
+def scoreBoard(gs):
+    if gs.checkmate:
+        if gs.whiteToMove:
+            gs.checkmate = False
+            return -CHECKMATE
+        else:
+            gs.checkmate = False
+            return CHECKMATE
+    elif gs.stalemate:
+        return STALEMATE
+
+    # Tính giai đoạn ván cờ (0: mở đầu, 1: trung cuộc, 2: tàn cuộc)
+    squares = gs.squares
+    total_material = gs.material
+    game_phase = 0  # Mở đầu
+    if total_material < 40:
+        game_phase = 1  # Trung cuộc
+    if total_material < 20:
+        game_phase = 2  # Tàn cuộc
+
+    # Vật chất, vị trí và kiểm soát trung tâm được GameState cộng dồn sẵn
+    score = gs.positionScore / EVAL_SCALE
+    king_safety = {"w": 0, "b": 0}
+    mobility = {"w": 0, "b": 0}
+    piece_coordination = {"w": 0, "b": 0}
+
+    # Cấu trúc tốt ít khi đổi giữa các nút anh em nên được lấy từ bảng băm tốt
+    pawnEntry = pawnHashTable.probe(gs.pawnKey)
+    if pawnEntry is None:
+        pawnEntry = evaluatePawnStructure(squares)
+        pawnHashTable.store(gs.pawnKey, pawnEntry)
+    structureScore, passedDifference, openFiles = pawnEntry
+    score += structureScore + passedDifference * (1.0 if game_phase == 2 else 0.5)
+
+    # Đếm số Tượng để tính điểm đôi Tượng, thưởng Xe trên cột mở và tính di động của Mã, Tượng, Xe, Hậu
+    # cho cả hai bên: số ô đích giả hợp lệ (ô trống hoặc quân địch) lấy từ bảng tia, không sinh Move
+    white_bishops = 0
+    black_bishops = 0
+    for sq in range(64):
+        square = squares[sq]
+        pieceType = square & TYPE_MASK
+        if pieceType < KNIGHT or pieceType > QUEEN:
+            continue
+        color = "b" if square & COLOR_MASK else "w"
+        if pieceType == BISHOP:
+            if color == "b":
+                black_bishops += 1
+            else:
+                white_bishops += 1
+        elif pieceType == ROOK and (openFiles >> (sq & 7)) & 1:
+            piece_coordination[color] += 0.5
+
+        allyColor = square & COLOR_MASK
+        count = 0
+        if pieceType == KNIGHT:
+            for target, _, _ in KNIGHT_TARGETS[sq]:
+                endPiece = squares[target]
+                if endPiece == EMPTY or endPiece & COLOR_MASK != allyColor:
+                    count += 1
+        else:
+            rays = RAYS[sq]
+            for j in MOBILITY_DIRECTIONS[pieceType]:
+                for target in rays[j]:
+                    endPiece = squares[target]
+                    if endPiece == EMPTY:
+                        count += 1
+                    else:
+                        if endPiece & COLOR_MASK != allyColor:
+                            count += 1
+                        break
+        mobility[color] += count * MOBILITY_WEIGHT
 
     # Đánh giá an toàn của vua
     white_king_pos = gs.whiteKinglocation
@@ -249,14 +713,7 @@ def scoreBoard(gs):
         king_safety["b"] += 0.5
     score += (king_safety["w"] - king_safety["b"])
 
-    # Đánh giá tính di động (chỉ tính cho Mã, Tượng, Xe, Hậu)
-    valid_moves = gs.getValidMoves()
-    for move in valid_moves:
-        piece = move.pieceMoved
-        if piece[0] == 'w' and piece[1] in ['N', 'B', 'R', 'Q']:
-            mobility["w"] += 0.1
-        elif piece[0] == 'b' and piece[1] in ['N', 'B', 'R', 'Q']:
-            mobility["b"] += 0.1
+    # Tính di động đã đếm cùng vòng lặp trên
     score += (mobility["w"] - mobility["b"])
 
     # Đánh giá tương tác giữa các quân cờ
@@ -265,12 +722,6 @@ def scoreBoard(gs):
         piece_coordination["w"] += 0.5
     if black_bishops >= 2:
         piece_coordination["b"] += 0.5
-    # Xe trên cột mở
-    for col in range(8):
-        if not white_pawns[col] and not black_pawns[col]:  # Cột mở
-            for piece in pieces_on_files[col]:
-                if piece[1] == 'R':
-                    piece_coordination[piece[0]] += 0.5
     score += (piece_coordination["w"] - piece_coordination["b"])
 
     return score
\ No newline at end of file
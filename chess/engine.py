@@ -1,16 +1,187 @@
 # chess/engine.py
+import random
+
+# Mã quân cờ: 3 bit thấp là loại quân, bit 3 là màu (0: trắng, 8: đen)
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE, BLACK = 0, 8
+TYPE_MASK = 7
+COLOR_MASK = 8
+
+PIECE_NAMES = ['--'] * 16
+for _color, _colorName in ((WHITE, 'w'), (BLACK, 'b')):
+    for _type, _typeName in ((PAWN, 'p'), (KNIGHT, 'N'), (BISHOP, 'B'), (ROOK, 'R'), (QUEEN, 'Q'), (KING, 'K')):
+        PIECE_NAMES[_color | _type] = _colorName + _typeName
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES) if name != '--'}
+PIECE_CODES['--'] = EMPTY
+
+# Bố cục số nguyên Move.packed: bit 0-5 ô xuất phát, 6-11 ô đích, 12-14 quân phong cấp,
+# 15-18 quân đi, 19-22 quân bị bắt, 23 bắt tốt qua đường, 24 nhập thành.
+# moveID là 15 bit thấp (ô đi, ô đến, quân phong cấp), đủ để phân biệt các nước trong một thế cờ
+MOVE_END_SHIFT = 6
+MOVE_PROMOTION_SHIFT = 12
+MOVE_PIECE_SHIFT = 15
+MOVE_CAPTURED_SHIFT = 19
+ENPASSANT_FLAG = 1 << 23
+CASTLE_FLAG = 1 << 24
+MOVE_ID_MASK = (1 << 15) - 1
+
+# Hướng đi của tốt cố định cho cả ván; True nếu bàn cờ lật (trắng ở phía trên)
+PLAYER_WANTS_TO_PLAY_AS_BLACK = False
+
+# PROMOTION_ROWS[piece][row]: quân piece đi tới hàng row thì được phong cấp
+PROMOTION_ROWS = [(False,) * 8] * 16
+PROMOTION_ROWS[WHITE | PAWN] = tuple(row == (7 if PLAYER_WANTS_TO_PLAY_AS_BLACK else 0) for row in range(8))
+PROMOTION_ROWS[BLACK | PAWN] = tuple(row == (0 if PLAYER_WANTS_TO_PLAY_AS_BLACK else 7) for row in range(8))
+
+# Bảng điểm cho đánh giá tăng dần (số nguyên để cộng trừ không bị sai số), do chessAi điền qua
+# setEvalTables: MATERIAL_VALUES[piece] là giá trị quân, PIECE_SQUARE_VALUES[piece][sq] là điểm
+# quân + vị trí của quân piece ở ô sq, dương cho trắng
+MATERIAL_VALUES = [0] * 16
+PIECE_SQUARE_VALUES = [[0] * 64 for _ in range(16)]
+
+
+def setEvalTables(materialValues, pieceSquareValues):
+    # Ghi đè tại chỗ để các tham chiếu tới bảng vẫn dùng được
+    MATERIAL_VALUES[:] = materialValues
+    for piece in range(16):
+        PIECE_SQUARE_VALUES[piece][:] = pieceSquareValues[piece]
+
+# Thứ tự hướng giống checkForPinsAndChecks: 0-3 là hàng/cột, 4-7 là đường chéo
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+# PAWN_CHECK_DIRECTIONS[color]: hướng (chỉ số trong DIRECTIONS) từ một ô tới tốt màu color đang tấn công ô đó,
+# lật cùng hướng đi của tốt khi PLAYER_WANTS_TO_PLAY_AS_BLACK
+PAWN_CHECK_DIRECTIONS = {WHITE: (4, 5), BLACK: (6, 7)} if PLAYER_WANTS_TO_PLAY_AS_BLACK else {WHITE: (6, 7), BLACK: (4, 5)}
+# ROOK_HOME_SQUARES[color]: ô gốc của xe cánh Hậu và xe cánh Vua
+ROOK_HOME_SQUARES = {WHITE: (0, 7), BLACK: (56, 63)} if PLAYER_WANTS_TO_PLAY_AS_BLACK else {WHITE: (56, 63), BLACK: (0, 7)}
+
+
+def buildRays():
+    # RAYS[sq][j]: các ô đi ra từ sq theo hướng DIRECTIONS[j], đến hết bàn cờ
+    rays = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        squareRays = []
+        for dRow, dCol in DIRECTIONS:
+            ray = []
+            endRow, endCol = row + dRow, col + dCol
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                ray.append(endRow * 8 + endCol)
+                endRow += dRow
+                endCol += dCol
+            squareRays.append(tuple(ray))
+        rays.append(tuple(squareRays))
+    return tuple(rays)
+
+
+def buildKnightTargets():
+    targets = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        squareTargets = []
+        for dRow, dCol in KNIGHT_OFFSETS:
+            if 0 <= row + dRow < 8 and 0 <= col + dCol < 8:
+                squareTargets.append(((row + dRow) * 8 + col + dCol, dRow, dCol))
+        targets.append(tuple(squareTargets))
+    return tuple(targets)
+
+
+RAYS = buildRays()
+KNIGHT_TARGETS = buildKnightTargets()
+
+# Khoá Zobrist 64 bit: một số ngẫu nhiên cho mỗi (quân, ô), lượt đen, mỗi tổ hợp
+# quyền nhập thành (4 bit: wks, wqs, bks, bqs) và mỗi cột bắt tốt qua đường.
+# Seed cố định để khoá giống nhau giữa các tiến trình và các lần chạy
+ZOBRIST_DEBUG = False  # True: kiểm tra khoá cập nhật dần với khoá tính lại sau mỗi nước
+
+
+def buildZobristKeys(seed):
+    rng = random.Random(seed)
+    pieces = [[rng.getrandbits(64) if PIECE_NAMES[piece] != '--' else 0 for sq in range(64)] for piece in range(16)]
+    blackToMove = rng.getrandbits(64)
+    castling = [rng.getrandbits(64) if mask else 0 for mask in range(16)]
+    enpassant = [rng.getrandbits(64) for col in range(8)]
+    return pieces, blackToMove, castling, enpassant
+
+
+ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_CASTLING, ZOBRIST_ENPASSANT = buildZobristKeys(0x5EED)
+
+
+def squaresFromNames(board):
+    return [PIECE_CODES[square] for row in board for square in row]
+
+
+START_SQUARES = squaresFromNames([
+    ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
+    ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp'],
+    ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR']
+])
+
+
+FEN_PIECES = {'P': WHITE | PAWN, 'N': WHITE | KNIGHT, 'B': WHITE | BISHOP, 'R': WHITE | ROOK, 'Q': WHITE | QUEEN,
+              'K': WHITE | KING, 'p': BLACK | PAWN, 'n': BLACK | KNIGHT, 'b': BLACK | BISHOP, 'r': BLACK | ROOK,
+              'q': BLACK | QUEEN, 'k': BLACK | KING}
+FEN_SYMBOLS = {piece: char for char, piece in FEN_PIECES.items()}
+# Ô vua và xe phải đứng để quyền nhập thành trong FEN có nghĩa: (ký tự, ô vua, ô xe), ô 0 là a8
+FEN_CASTLING = (('K', 60, 63), ('Q', 60, 56), ('k', 4, 7), ('q', 4, 0))
+
+
+def newGameState(backend="mailbox", fen=None):
+    # Chọn bộ sinh nước đi khi tạo ván cờ: "mailbox" (mảng 64 ô) hoặc "bitboard"
+    if backend == "bitboard":
+        from .bitboard import BitboardGameState
+        gs = BitboardGameState()
+    else:
+        gs = GameState()
+    if fen is not None:
+        gs.loadFen(fen)
+    return gs
+
+
+class BoardView:
+    # Lớp chuyển đổi mỏng: cho phép giao diện đọc/ghi bàn cờ theo tên quân ('wN', '--')
+    def __init__(self, squares):
+        self.squares = squares
+
+    def __getitem__(self, row):
+        return BoardRowView(self.squares, row)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for row in range(8):
+            yield BoardRowView(self.squares, row)
+
+
+class BoardRowView:
+    def __init__(self, squares, row):
+        self.squares = squares
+        self.offset = row * 8
+
+    def __getitem__(self, col):
+        return PIECE_NAMES[self.squares[self.offset + col]]
+
+    def __setitem__(self, col, name):
+        self.squares[self.offset + col] = PIECE_CODES[name]
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for col in range(8):
+            yield PIECE_NAMES[self.squares[self.offset + col]]
+
+
 class GameState:
     def __init__(self):
-        self.board = [
-            ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
-            ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp'],
-            ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR']
-        ]
+        self.squares = list(START_SQUARES)
 
         self.board1 = [
             ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR'],
@@ -23,10 +194,10 @@ class GameState:
             ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR']
         ]
 
-        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
-                              'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+        self.moveFunctions = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves,
+                              BISHOP: self.getBishopMoves, QUEEN: self.getQueenMoves, KING: self.getKingMoves}
         self.whiteToMove = True
-        self.playerWantsToPlayAsBlack = False
+        self.playerWantsToPlayAsBlack = PLAYER_WANTS_TO_PLAY_AS_BLACK
         self.moveLog = []
         if self.playerWantsToPlayAsBlack:
             self.whiteKinglocation = (0, 4)
@@ -49,65 +220,327 @@ class GameState:
         self.castleRightsLog = [castleRights(
             self.whiteCastleKingside, self.whiteCastleQueenside, self.blackCastleKingside, self.blackCastleQueenside)]
         self.fiftyMoveCounter = 0  # Đếm số nước đi cho luật 50 nước
+        self.fiftyMoveCounterLog = [self.fiftyMoveCounter]
+        self.startPly = 0  # Số nửa nước đã đi trước thế cờ ban đầu (từ số nước trong FEN)
+        self.startFen = None  # FEN đã nạp bằng loadFen, None khi ván bắt đầu từ thế cờ ban đầu
+        self.capturesOnly = False  # Chỉ sinh nước ăn quân và phong cấp (tìm kiếm tĩnh)
+        self.zobristDebug = ZOBRIST_DEBUG
+        self.zobristKey = self.computeZobristKey()
+        self.positionKeys = [self.zobristKey]  # Khoá Zobrist của mọi thế cờ từ đầu ván, để phát hiện lặp lại
+        self.pawnKey = self.computePawnKey()
+        self.material, self.positionScore = self.computeEvalTotals()
+
+    @property
+    def board(self):
+        # Bàn cờ theo tên quân, chỉ dùng cho giao diện; engine làm việc trực tiếp trên self.squares
+        return BoardView(self.squares)
+
+    @board.setter
+    def board(self, board):
+        self.squares = squaresFromNames(board)
+        self.zobristKey = self.computeZobristKey()
+        self.positionKeys = [self.zobristKey]
+        self.pawnKey = self.computePawnKey()
+        self.material, self.positionScore = self.computeEvalTotals()
+
+    def loadFen(self, fen):
+        # Đặt thế cờ từ chuỗi FEN (trắng ở phía dưới bàn cờ); xoá lịch sử nước đi. Quyền nhập thành
+        # khi vua/xe không ở ô gốc và ô bắt tốt qua đường không có tốt vừa đi hai ô bị bỏ qua
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        rows = fields[0].split('/')
+        squares = []
+        for row in rows:
+            for char in row:
+                if char.isdigit():
+                    squares.extend([EMPTY] * int(char))
+                elif char in FEN_PIECES:
+                    squares.append(FEN_PIECES[char])
+                else:
+                    raise ValueError(f"Invalid FEN piece {char!r}: {fen!r}")
+        if len(rows) != 8 or len(squares) != 64 or fields[1] not in ('w', 'b') or \
+                squares.count(WHITE | KING) != 1 or squares.count(BLACK | KING) != 1:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        if any(squares[sq] & TYPE_MASK == PAWN for sq in list(range(8)) + list(range(56, 64))):
+            raise ValueError(f"Invalid FEN, pawn on the first or last rank: {fen!r}")
+        castling = fields[2] if len(fields) > 2 else '-'
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        if castling != '-' and (not castling or any(char not in 'KQkq' for char in castling)):
+            raise ValueError(f"Invalid FEN castling rights {castling!r}: {fen!r}")
+        if enpassant != '-' and (len(enpassant) != 2 or enpassant[0] not in Move.filesToCols
+                                 or enpassant[1] not in Move.ranksToRows):
+            raise ValueError(f"Invalid FEN en passant square {enpassant!r}: {fen!r}")
+        try:
+            fiftyMoveCounter = int(fields[4]) if len(fields) > 4 else 0
+            fullMoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Invalid FEN move counters: {fen!r}") from None
+        if fiftyMoveCounter < 0 or fullMoveNumber < 1:
+            raise ValueError(f"Invalid FEN move counters: {fen!r}")
+
+        self.squares = squares
+        self.whiteKinglocation = divmod(squares.index(WHITE | KING), 8)
+        self.blackKinglocation = divmod(squares.index(BLACK | KING), 8)
+        self.whiteToMove = fields[1] == 'w'
+        rights = {char for char, kingSq, rookSq in FEN_CASTLING if char in castling
+                  and squares[kingSq] == FEN_PIECES['K' if char.isupper() else 'k']
+                  and squares[rookSq] == FEN_PIECES['R' if char.isupper() else 'r']}
+        self.whiteCastleKingside = 'K' in rights
+        self.whiteCastleQueenside = 'Q' in rights
+        self.blackCastleKingside = 'k' in rights
+        self.blackCastleQueenside = 'q' in rights
+        self.castleRightsLog = [castleRights(
+            self.whiteCastleKingside, self.whiteCastleQueenside, self.blackCastleKingside, self.blackCastleQueenside)]
+        self.enpasantPossible = ()
+        if enpassant != '-':
+            row, col = Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]]
+            # Tốt vừa đi hai ô phải đứng ngay trước ô bắt qua đường, tính từ phía bên đi
+            pawnRow, pawn = (row + 1, BLACK | PAWN) if self.whiteToMove else (row - 1, WHITE | PAWN)
+            if row == (2 if self.whiteToMove else 5) and squares[pawnRow * 8 + col] == pawn:
+                self.enpasantPossible = (row, col)
+        self.enpasantPossibleLog = [self.enpasantPossible]
+        self.fiftyMoveCounter = fiftyMoveCounter
+        self.fiftyMoveCounterLog = [fiftyMoveCounter]
+        self.startPly = 2 * (fullMoveNumber - 1) + (0 if self.whiteToMove else 1)
+        self.startFen = fen
+        self.moveLog = []
+        self.checkmate = False
+        self.stalemate = False
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.zobristKey = self.computeZobristKey()
+        self.positionKeys = [self.zobristKey]
+        self.pawnKey = self.computePawnKey()
+        self.material, self.positionScore = self.computeEvalTotals()
+
+    def getFen(self):
+        # Chuỗi FEN của thế cờ hiện tại, cùng quy ước với loadFen (hàng 0 của squares là hàng 8)
+        rows = []
+        for row in range(8):
+            text = ''
+            emptyCount = 0
+            for piece in self.squares[row * 8:row * 8 + 8]:
+                if piece == EMPTY:
+                    emptyCount += 1
+                    continue
+                if emptyCount:
+                    text += str(emptyCount)
+                    emptyCount = 0
+                text += FEN_SYMBOLS[piece]
+            rows.append(text + (str(emptyCount) if emptyCount else ''))
+        rights = self.castleRightsLog[-1]
+        castling = ''.join(char for char, allowed in zip('KQkq', (rights.wks, rights.wqs, rights.bks, rights.bqs))
+                           if allowed) or '-'
+        if self.enpasantPossible:
+            row, col = self.enpasantPossible
+            enpassant = Move.colsToFiles[col] + Move.rowsToRanks[row]
+        else:
+            enpassant = '-'
+        fullMoveNumber = (self.startPly + len(self.moveLog)) // 2 + 1
+        return f"{'/'.join(rows)} {'w' if self.whiteToMove else 'b'} {castling} {enpassant} " \
+               f"{self.fiftyMoveCounter} {fullMoveNumber}"
+
+    def computeZobristKey(self):
+        # Tính lại toàn bộ khoá từ thế cờ hiện tại (dùng khi khởi tạo và để kiểm tra)
+        key = 0
+        for sq, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                key ^= ZOBRIST_PIECES[piece][sq]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castleRightsLog[-1].mask]
+        if self.enpasantPossibleLog[-1]:
+            key ^= ZOBRIST_ENPASSANT[self.enpasantPossibleLog[-1][1]]
+        return key
+
+    def computePawnKey(self):
+        # Khoá chỉ theo vị trí các con tốt, dùng cho bảng băm cấu trúc tốt
+        key = 0
+        for sq, piece in enumerate(self.squares):
+            if piece & TYPE_MASK == PAWN:
+                key ^= ZOBRIST_PIECES[piece][sq]
+        return key
+
+    def pawnKeyMoveDelta(self, packed):
+        # Chỉ đổi khi tốt di chuyển, bị bắt hoặc phong cấp
+        startSq = packed & 63
+        endSq = (packed >> MOVE_END_SHIFT) & 63
+        pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+        pieceCaptured = (packed >> MOVE_CAPTURED_SHIFT) & 15
+        delta = 0
+        if pieceMoved & TYPE_MASK == PAWN:
+            delta = ZOBRIST_PIECES[pieceMoved][startSq]
+            if not (packed >> MOVE_PROMOTION_SHIFT) & 7:
+                delta ^= ZOBRIST_PIECES[pieceMoved][endSq]
+        if pieceCaptured & TYPE_MASK == PAWN:
+            capturedSq = (startSq & 56) | (endSq & 7) if packed & ENPASSANT_FLAG else endSq
+            delta ^= ZOBRIST_PIECES[pieceCaptured][capturedSq]
+        return delta
+
+    def zobristMoveDelta(self, packed):
+        # Phần khoá thay đổi giữa hai thế cờ cuối trong castleRightsLog/enpasantPossibleLog,
+        # tức trước và sau nước packed; XOR nên dùng chung cho makeMove và undoMove
+        startSq = packed & 63
+        endSq = (packed >> MOVE_END_SHIFT) & 63
+        pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+        pieceCaptured = (packed >> MOVE_CAPTURED_SHIFT) & 15
+        promotionPiece = (packed >> MOVE_PROMOTION_SHIFT) & 7
+        pieceKeys = ZOBRIST_PIECES[pieceMoved]
+        delta = ZOBRIST_BLACK_TO_MOVE ^ pieceKeys[startSq]
+        if promotionPiece:
+            delta ^= ZOBRIST_PIECES[(pieceMoved & COLOR_MASK) | promotionPiece][endSq]
+        else:
+            delta ^= pieceKeys[endSq]
+        if packed & ENPASSANT_FLAG:
+            delta ^= ZOBRIST_PIECES[pieceCaptured][(startSq & 56) | (endSq & 7)]
+        elif pieceCaptured != EMPTY:
+            delta ^= ZOBRIST_PIECES[pieceCaptured][endSq]
+        if packed & CASTLE_FLAG:
+            rookKeys = ZOBRIST_PIECES[(pieceMoved & COLOR_MASK) | ROOK]
+            if endSq - startSq == 2:
+                delta ^= rookKeys[endSq + 1] ^ rookKeys[endSq - 1]
+            else:
+                delta ^= rookKeys[endSq - 2] ^ rookKeys[endSq + 1]
+        castleLog = self.castleRightsLog
+        delta ^= ZOBRIST_CASTLING[castleLog[-1].mask] ^ ZOBRIST_CASTLING[castleLog[-2].mask]
+        enpasantLog = self.enpasantPossibleLog
+        if enpasantLog[-1]:
+            delta ^= ZOBRIST_ENPASSANT[enpasantLog[-1][1]]
+        if enpasantLog[-2]:
+            delta ^= ZOBRIST_ENPASSANT[enpasantLog[-2][1]]
+        return delta
+
+    def checkZobristKey(self, move, action):
+        if self.zobristKey != self.computeZobristKey():
+            raise RuntimeError(f"Zobrist key mismatch after {action} {move}")
+        if self.pawnKey != self.computePawnKey():
+            raise RuntimeError(f"Pawn key mismatch after {action} {move}")
+        if (self.material, self.positionScore) != self.computeEvalTotals():
+            raise RuntimeError(f"Incremental evaluation mismatch after {action} {move}")
+
+    def computeEvalTotals(self):
+        # Tổng giá trị quân trên bàn (để tính giai đoạn ván cờ) và tổng điểm quân + vị trí
+        material = 0
+        positionScore = 0
+        for sq, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                material += MATERIAL_VALUES[piece]
+                positionScore += PIECE_SQUARE_VALUES[piece][sq]
+        return material, positionScore
+
+    def evalMoveDelta(self, packed):
+        # Thay đổi của (material, positionScore) khi đi nước packed; undoMove trừ lại đúng lượng này
+        startSq = packed & 63
+        endSq = (packed >> MOVE_END_SHIFT) & 63
+        pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+        pieceCaptured = (packed >> MOVE_CAPTURED_SHIFT) & 15
+        promotionPiece = (packed >> MOVE_PROMOTION_SHIFT) & 7
+        materialDelta = 0
+        positionDelta = -PIECE_SQUARE_VALUES[pieceMoved][startSq]
+        if promotionPiece:
+            promoted = (pieceMoved & COLOR_MASK) | promotionPiece
+            materialDelta += MATERIAL_VALUES[promoted] - MATERIAL_VALUES[pieceMoved]
+            positionDelta += PIECE_SQUARE_VALUES[promoted][endSq]
+        else:
+            positionDelta += PIECE_SQUARE_VALUES[pieceMoved][endSq]
+        if pieceCaptured != EMPTY:
+            capturedSq = (startSq & 56) | (endSq & 7) if packed & ENPASSANT_FLAG else endSq
+            materialDelta -= MATERIAL_VALUES[pieceCaptured]
+            positionDelta -= PIECE_SQUARE_VALUES[pieceCaptured][capturedSq]
+        if packed & CASTLE_FLAG:
+            rookValues = PIECE_SQUARE_VALUES[(pieceMoved & COLOR_MASK) | ROOK]
+            if endSq - startSq == 2:
+                positionDelta += rookValues[endSq - 1] - rookValues[endSq + 1]
+            else:
+                positionDelta += rookValues[endSq + 1] - rookValues[endSq - 2]
+        return materialDelta, positionDelta
 
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        squares = self.squares
+        packed = move.packed
+        startSq = packed & 63
+        endSq = (packed >> MOVE_END_SHIFT) & 63
+        pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+        promotionPiece = (packed >> MOVE_PROMOTION_SHIFT) & 7
+        squares[startSq] = EMPTY
+        if promotionPiece:
+            squares[endSq] = (pieceMoved & COLOR_MASK) | promotionPiece
+        else:
+            squares[endSq] = pieceMoved
         self.moveLog.append(move)
         self.whiteToMove = not self.whiteToMove
 
-        if move.pieceMoved == 'wK':
-            self.whiteKinglocation = (move.endRow, move.endCol)
-            self.whiteCastleKingside = False
-            self.whiteCastleQueenside = False
-        elif move.pieceMoved == 'bK':
-            self.blackKinglocation = (move.endRow, move.endCol)
-            self.blackCastleKingside = False
-            self.blackCastleQueenside = False
+        if pieceMoved == WHITE | KING:
+            self.whiteKinglocation = (endSq >> 3, endSq & 7)
+        elif pieceMoved == BLACK | KING:
+            self.blackKinglocation = (endSq >> 3, endSq & 7)
 
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = '--'
+        if packed & ENPASSANT_FLAG:
+            squares[(startSq & 56) | (endSq & 7)] = EMPTY
 
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-            self.enpasantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
+        if pieceMoved & TYPE_MASK == PAWN and abs(startSq - endSq) == 16:
+            self.enpasantPossible = ((startSq + endSq) >> 4, startSq & 7)
         else:
             self.enpasantPossible = ()
 
         # Cập nhật luật 50 nước
-        if move.pieceCaptured != '--' or move.pieceMoved[1] == 'p':
+        if (packed >> MOVE_CAPTURED_SHIFT) & 15 != EMPTY or pieceMoved & TYPE_MASK == PAWN:
             self.fiftyMoveCounter = 0  # Reset nếu có bắt quân hoặc di chuyển tốt
         else:
             self.fiftyMoveCounter += 1
+        self.fiftyMoveCounterLog.append(self.fiftyMoveCounter)
 
         self.updateCastleRights(move)
         self.castleRightsLog.append(castleRights(
             self.whiteCastleKingside, self.whiteCastleQueenside, self.blackCastleKingside, self.blackCastleQueenside))
         self.enpasantPossibleLog.append(self.enpasantPossible)
 
-        if move.castle:
-            if move.endCol - move.startCol == 2:
-                self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1]
-                self.board[move.endRow][move.endCol + 1] = "--"
+        if packed & CASTLE_FLAG:
+            if endSq - startSq == 2:
+                squares[endSq - 1] = squares[endSq + 1]
+                squares[endSq + 1] = EMPTY
             else:
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]
-                self.board[move.endRow][move.endCol - 2] = "--"
+                squares[endSq + 1] = squares[endSq - 2]
+                squares[endSq - 2] = EMPTY
+
+        self.zobristKey ^= self.zobristMoveDelta(packed)
+        self.pawnKey ^= self.pawnKeyMoveDelta(packed)
+        materialDelta, positionDelta = self.evalMoveDelta(packed)
+        self.material += materialDelta
+        self.positionScore += positionDelta
+        self.positionKeys.append(self.zobristKey)
+        if self.zobristDebug:
+            self.checkZobristKey(move, "makeMove")
 
     def undoMove(self):
         if len(self.moveLog) != 0:
+            squares = self.squares
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            packed = move.packed
+            startSq = packed & 63
+            endSq = (packed >> MOVE_END_SHIFT) & 63
+            pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+            pieceCaptured = (packed >> MOVE_CAPTURED_SHIFT) & 15
+            squares[startSq] = pieceMoved
+            squares[endSq] = pieceCaptured
             self.whiteToMove = not self.whiteToMove
 
-            if move.pieceMoved == 'wK':
-                self.whiteKinglocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKinglocation = (move.startRow, move.startCol)
+            if pieceMoved == WHITE | KING:
+                self.whiteKinglocation = (startSq >> 3, startSq & 7)
+            elif pieceMoved == BLACK | KING:
+                self.blackKinglocation = (startSq >> 3, startSq & 7)
 
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = "--"
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
+            if packed & ENPASSANT_FLAG:
+                squares[endSq] = EMPTY
+                squares[(startSq & 56) | (endSq & 7)] = pieceCaptured
 
+            self.zobristKey ^= self.zobristMoveDelta(packed)
+            self.pawnKey ^= self.pawnKeyMoveDelta(packed)
+            materialDelta, positionDelta = self.evalMoveDelta(packed)
+            self.material -= materialDelta
+            self.positionScore -= positionDelta
             self.enpasantPossibleLog.pop()
             self.enpasantPossible = self.enpasantPossibleLog[-1]
 
@@ -118,17 +551,22 @@ class GameState:
             self.blackCastleKingside = castleRights.bks
             self.blackCastleQueenside = castleRights.bqs
 
-            if move.castle:
-                if move.endCol - move.startCol == 2:
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = "--"
+            if packed & CASTLE_FLAG:
+                if endSq - startSq == 2:
+                    squares[endSq + 1] = squares[endSq - 1]
+                    squares[endSq - 1] = EMPTY
                 else:
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = "--"
+                    squares[endSq - 2] = squares[endSq + 1]
+                    squares[endSq + 1] = EMPTY
 
             self.checkmate = False
             self.stalemate = False
-            self.fiftyMoveCounter -= 1  # Giảm bộ đếm khi undo
+            # Lấy lại từ log vì nước ăn quân/đi tốt đã đặt bộ đếm về 0
+            self.fiftyMoveCounterLog.pop()
+            self.fiftyMoveCounter = self.fiftyMoveCounterLog[-1]
+            self.positionKeys.pop()
+            if self.zobristDebug:
+                self.checkZobristKey(move, "undoMove")
 
     def getValidMoves(self):
         moves = []
@@ -145,25 +583,102 @@ class GameState:
                 check = self.checks[0]
                 checkRow = check[0]
                 checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
+                pieceChecking = self.squares[checkRow * 8 + checkCol]
+                validSquares = set()
+                if pieceChecking & TYPE_MASK == KNIGHT:
+                    validSquares.add(checkRow * 8 + checkCol)
                 else:
                     for i in range(1, 8):
-                        validSq = (kingRow + check[2] * i, kingCol + check[3] * i)
-                        validSquares.append(validSq)
-                        if validSq[0] == checkRow and validSq[1] == checkCol:
+                        validSq = (kingRow + check[2] * i) * 8 + kingCol + check[3] * i
+                        validSquares.add(validSq)
+                        if validSq == checkRow * 8 + checkCol:
                             break
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved[1] != 'K':
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            moves.remove(moves[i])
+                # Bắt tốt qua đường cũng gỡ được chiếu nếu con tốt bị bắt là quân đang chiếu
+                moves = [move for move in moves if move.pieceMoved & TYPE_MASK == KING or
+                         move.endRow * 8 + move.endCol in validSquares or
+                         (move.isEnpassantMove and (move.startRow, move.endCol) == (checkRow, checkCol))]
             else:
                 self.getKingMoves(kingRow, kingCol, moves)
         else:
             moves = self.getAllPossibleMoves()
+        return self.finishValidMoves(moves)
+
+    def getCaptureMoves(self):
+        # Nước ăn quân và phong Hậu cho tìm kiếm tĩnh; khi bị chiếu trả về mọi nước thoát chiếu.
+        # Không sinh đủ nước nên chỉ biết chiếu hết khi đang bị chiếu, không biết hòa pat
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return self.getValidMoves()
+        self.capturesOnly = True
+        try:
+            moves = self.getAllPossibleMoves()
+        finally:
+            self.capturesOnly = False
+        self.checkmate = False
+        self.stalemate = self.fiftyMoveCounter >= 100
+        return moves
+
+    def getPieceMoves(self, sq):
+        # Nước hợp lệ của riêng quân ở ô sq, dùng để kiểm tra nước trong bảng băm hay nước sát thủ
+        # mà không phải sinh nước cho cả bàn cờ
+        piece = self.squares[sq]
+        if piece == EMPTY or (piece & COLOR_MASK == WHITE) != self.whiteToMove:
+            return []
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return [move for move in self.getValidMoves() if move.packed & 63 == sq]
+        moves = []
+        self.moveFunctions[piece & TYPE_MASK](sq >> 3, sq & 7, moves)
+        return moves
+
+    def getStagedMoves(self, priorityMoveIDs=(), killerMoveIDs=(), sortKey=None):
+        # Sinh nước theo từng giai đoạn, giai đoạn sau chỉ được sinh khi người gọi lấy tiếp:
+        # nước ưu tiên (biến chính, bảng băm), ăn quân, nước sát thủ, rồi các nước còn lại.
+        # sortKey (nếu có) sắp xếp trong từng giai đoạn, lớn trước. Khi hết nước mà chưa trả ra nước nào
+        # thì checkmate/stalemate đã được đặt như sau getValidMoves
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            # Số nước thoát chiếu ít, sinh hết một lần
+            moves = self.getValidMoves()
+            if sortKey is not None:
+                moves.sort(key=sortKey, reverse=True)
+            yield from moves
+            return
 
+        searched = set()
+        for moveID in priorityMoveIDs:
+            if moveID and moveID not in searched:
+                for move in self.getPieceMoves(moveID & 63):
+                    if move.moveID == moveID:
+                        searched.add(moveID)
+                        yield move
+                        break
+
+        captures = self.getCaptureMoves()
+        if sortKey is not None:
+            captures.sort(key=sortKey, reverse=True)
+        for move in captures:
+            if move.moveID not in searched:
+                searched.add(move.moveID)
+                yield move
+
+        for moveID in killerMoveIDs:
+            if moveID and moveID not in searched:
+                for move in self.getPieceMoves(moveID & 63):
+                    if move.moveID == moveID:
+                        searched.add(moveID)
+                        yield move
+                        break
+
+        # Giai đoạn cuối sinh đủ nước hợp lệ (đặt luôn cờ hòa pat/50 nước) và bỏ các nước đã trả ra
+        moves = self.getValidMoves()
+        if sortKey is not None:
+            moves.sort(key=sortKey, reverse=True)
+        for move in moves:
+            if move.moveID not in searched:
+                yield move
+
+    def finishValidMoves(self, moves):
         # Kiểm tra hòa do luật 50 nước
         if self.fiftyMoveCounter >= 100:  # 50 nước mỗi bên (100 nước đi)
             self.stalemate = True
@@ -180,40 +695,38 @@ class GameState:
         return moves
 
     def squareUnderAttack(self, row, col, allyColor):
-        enemyColor = 'w' if allyColor == 'b' else 'b'
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1),
-                      (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            for i in range(1, 8):
-                endRow = row + d[0] * i
-                endCol = col + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor:
-                        break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        if (0 <= j <= 3 and type == 'R') or (4 <= j <= 7 and type == 'B') or \
-                            (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            return True
-                        else:
-                            break
-                else:
+        squares = self.squares
+        enemyColor = WHITE if allyColor == BLACK else BLACK
+        for j, ray in enumerate(RAYS[row * 8 + col]):
+            for i, target in enumerate(ray, 1):
+                endPiece = squares[target]
+                if endPiece == EMPTY:
+                    continue
+                if endPiece & COLOR_MASK == allyColor:
                     break
+                type = endPiece & TYPE_MASK
+                if (0 <= j <= 3 and type == ROOK) or (4 <= j <= 7 and type == BISHOP) or \
+                    (i == 1 and type == PAWN and j in PAWN_CHECK_DIRECTIONS[enemyColor]) or \
+                        (type == QUEEN) or (i == 1 and type == KING):
+                    return True
+                break
+        enemyKnight = enemyColor | KNIGHT
+        for target, _, _ in KNIGHT_TARGETS[row * 8 + col]:
+            if squares[target] == enemyKnight:
+                return True
 
     def getAllPossibleMoves(self):
         moves = []
-        for row in range(len(self.board)):
-            for col in range(len(self.board[0])):
-                turn = self.board[row][col][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[row][col][1]
-                    self.moveFunctions[piece](row, col, moves)
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for sq in range(64):
+            piece = squares[sq]
+            if piece != EMPTY and piece & COLOR_MASK == allyColor:
+                self.moveFunctions[piece & TYPE_MASK](sq >> 3, sq & 7, moves)
         return moves
 
     def getPawnMoves(self, row, col, moves):
+        squares = self.squares
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins)-1, -1, -1):
@@ -227,34 +740,39 @@ class GameState:
             if self.whiteToMove:
                 moveAmount = 1
                 startRow = 1
-                enemyColor = 'b'
+                enemyColor = BLACK
                 kingRow, kingCol = self.whiteKinglocation
             else:
                 moveAmount = -1
                 startRow = 6
-                enemyColor = 'w'
+                enemyColor = WHITE
                 kingRow, kingCol = self.blackKinglocation
         else:
             if self.whiteToMove:
                 moveAmount = -1
                 startRow = 6
-                enemyColor = 'b'
+                enemyColor = BLACK
                 kingRow, kingCol = self.whiteKinglocation
             else:
                 moveAmount = 1
                 startRow = 1
-                enemyColor = 'w'
+                enemyColor = WHITE
                 kingRow, kingCol = self.blackKinglocation
 
-        if self.board[row + moveAmount][col] == "--":
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                moves.append(Move((row, col), (row+moveAmount, col), self.board))
-                if row == startRow and self.board[row+2*moveAmount][col] == "--":
-                    moves.append(Move((row, col), (row+2*moveAmount, col), self.board))
+        sq = row * 8 + col
+        forward = 8 * moveAmount
+        rowStart = row * 8
+        nextRowStart = rowStart + forward
+        if squares[nextRowStart + col] == EMPTY and (not self.capturesOnly or PROMOTION_ROWS[squares[sq]][row + moveAmount]):
+            if not piecePinned or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0):
+                self.addPawnMove(sq, sq + forward, moves)
+                if row == startRow and squares[nextRowStart + 8 * moveAmount + col] == EMPTY:
+                    moves.append(Move(sq, sq + 2 * forward, squares))
         if col-1 >= 0:
             if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[row+moveAmount][col-1][0] == enemyColor:
-                    moves.append(Move((row, col), (row+moveAmount, col-1), self.board))
+                target = squares[nextRowStart + col - 1]
+                if target != EMPTY and target & COLOR_MASK == enemyColor:
+                    self.addPawnMove(sq, sq + forward - 1, moves)
                 if (row+moveAmount, col-1) == self.enpasantPossible:
                     attackingPiece = blockingPiece = False
                     if kingRow == row:
@@ -265,20 +783,23 @@ class GameState:
                             insideRange = range(kingCol - 1, col, -1)
                             outsideRange = range(col - 2, -1, -1)
                         for i in insideRange:
-                            if self.board[row][i] != "--":
+                            if squares[rowStart + i] != EMPTY:
                                 blockingPiece = True
                         for i in outsideRange:
-                            square = self.board[row][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
+                            square = squares[rowStart + i]
+                            if square == enemyColor | ROOK or square == enemyColor | QUEEN:
                                 attackingPiece = True
-                            elif square != "--":
+                                break
+                            elif square != EMPTY:
                                 blockingPiece = True
+                                break
                     if not attackingPiece or blockingPiece:
-                        moves.append(Move((row, col), (row+moveAmount, col-1), self.board, isEnpassantMove=True))
+                        moves.append(Move(sq, sq + forward - 1, squares, isEnpassantMove=True))
         if col+1 <= 7:
             if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[row+moveAmount][col+1][0] == enemyColor:
-                    moves.append(Move((row, col), (row+moveAmount, col+1), self.board))
+                target = squares[nextRowStart + col + 1]
+                if target != EMPTY and target & COLOR_MASK == enemyColor:
+                    self.addPawnMove(sq, sq + forward + 1, moves)
                 if (row+moveAmount, col+1) == self.enpasantPossible:
                     attackingPiece = blockingPiece = False
                     if kingRow == row:
@@ -289,16 +810,26 @@ class GameState:
                             insideRange = range(kingCol - 1, col + 1, -1)
                             outsideRange = range(col - 1, -1, -1)
                         for i in insideRange:
-                            if self.board[row][i] != "--":
+                            if squares[rowStart + i] != EMPTY:
                                 blockingPiece = True
                         for i in outsideRange:
-                            square = self.board[row][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
+                            square = squares[rowStart + i]
+                            if square == enemyColor | ROOK or square == enemyColor | QUEEN:
                                 attackingPiece = True
-                            elif square != "--":
+                                break
+                            elif square != EMPTY:
                                 blockingPiece = True
+                                break
                     if not attackingPiece or blockingPiece:
-                        moves.append(Move((row, col), (row+moveAmount, col+1), self.board, isEnpassantMove=True))
+                        moves.append(Move(sq, sq + forward + 1, squares, isEnpassantMove=True))
+
+    def addPawnMove(self, startSq, endSq, moves):
+        move = Move(startSq, endSq, self.squares)
+        moves.append(move)
+        if move.isPawnPromotion and not self.capturesOnly:
+            # Sinh đủ bốn kiểu phong cấp; nước phong Hậu đứng đầu
+            for promotionPiece in (ROOK, BISHOP, KNIGHT):
+                moves.append(Move(startSq, endSq, self.squares, promotionPiece=promotionPiece))
 
     def getRookMoves(self, row, col, moves):
         piecePinned = False
@@ -307,29 +838,10 @@ class GameState:
             if self.pins[i][0] == row and self.pins[i][1] == col:
                 piecePinned = True
                 pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[row][col][1] != 'Q':
+                if self.squares[row * 8 + col] & TYPE_MASK != QUEEN:
                     self.pins.remove(self.pins[i])
                 break
-
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-        enemy_color = 'b' if self.whiteToMove else 'w'
-
-        for direction in directions:
-            for i in range(1, 8):
-                endRow = row + direction[0] * i
-                endCol = col + direction[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == direction or pinDirection == (-direction[0], -direction[1]):
-                        if self.board[endRow][endCol] == '--':
-                            moves.append(Move((row, col), (endRow, endCol), self.board))
-                        elif self.board[endRow][endCol][0] == enemy_color:
-                            if not piecePinned or pinDirection == direction:
-                                moves.append(Move((row, col), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+        self.getSlidingMoves(row, col, moves, (2, 0, 3, 1), piecePinned, pinDirection, True)
 
     def getBishopMoves(self, row, col, moves):
         piecePinned = False
@@ -338,25 +850,29 @@ class GameState:
             if self.pins[i][0] == row and self.pins[i][1] == col:
                 piecePinned = True
                 pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
+                if self.squares[row * 8 + col] & TYPE_MASK != QUEEN:
+                    self.pins.remove(self.pins[i])
                 break
+        self.getSlidingMoves(row, col, moves, (7, 4, 5, 6), piecePinned, pinDirection, False)
 
-        directions = [(1, 1), (-1, -1), (-1, 1), (1, -1)]
-        enemy_color = 'b' if self.whiteToMove else 'w'
-
-        for direction in directions:
-            for i in range(1, 8):
-                endRow = row + direction[0] * i
-                endCol = col + direction[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == direction or pinDirection == (-direction[0], -direction[1]):
-                        if self.board[endRow][endCol] == '--':
-                            moves.append(Move((row, col), (endRow, endCol), self.board))
-                        elif self.board[endRow][endCol][0] == enemy_color:
-                            moves.append(Move((row, col), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+    def getSlidingMoves(self, row, col, moves, directionIndexes, piecePinned, pinDirection, pinnedCaptureNeedsSameDirection):
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        sq = row * 8 + col
+        rays = RAYS[sq]
+        for j in directionIndexes:
+            direction = DIRECTIONS[j]
+            if piecePinned and pinDirection != direction and pinDirection != (-direction[0], -direction[1]):
+                continue
+            for target in rays[j]:
+                endPiece = squares[target]
+                if endPiece == EMPTY:
+                    if not self.capturesOnly:
+                        moves.append(Move(sq, target, squares))
+                elif endPiece & COLOR_MASK == enemyColor:
+                    if not (pinnedCaptureNeedsSameDirection and piecePinned) or pinDirection == direction:
+                        moves.append(Move(sq, target, squares))
+                    break
                 else:
                     break
 
@@ -368,42 +884,43 @@ class GameState:
                 self.pins.remove(self.pins[i])
                 break
 
-        AllPossibleKnightMoves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
-        for m in AllPossibleKnightMoves:
-            endRow = row + m[0]
-            endCol = col + m[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                if not piecePinned:
-                    if self.whiteToMove and (self.board[endRow][endCol] == '--' or self.board[endRow][endCol][0] == 'b'):
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
-                    elif not self.whiteToMove and (self.board[endRow][endCol] == '--' or self.board[endRow][endCol][0] == 'w'):
-                        moves.append(Move((row, col), (endRow, endCol), self.board))
+        if piecePinned:
+            return
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        sq = row * 8 + col
+        for target, _, _ in KNIGHT_TARGETS[sq]:
+            endPiece = squares[target]
+            if (endPiece == EMPTY and not self.capturesOnly) or (endPiece != EMPTY and endPiece & COLOR_MASK != allyColor):
+                moves.append(Move(sq, target, squares))
 
     def getQueenMoves(self, row, col, moves):
         self.getBishopMoves(row, col, moves)
         self.getRookMoves(row, col, moves)
 
     def getKingMoves(self, row, col, moves):
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
         for i in range(-1, 2):
             for j in range(-1, 2):
-                allyColor = 'w' if self.whiteToMove else 'b'
                 if i == 0 and j == 0:
                     continue
                 if 0 <= row + i <= 7 and 0 <= col + j <= 7:
-                    endPiece = self.board[row + i][col + j]
-                    if endPiece[0] != allyColor:
-                        if allyColor == 'w':
+                    endPiece = squares[(row + i) * 8 + col + j]
+                    if (endPiece == EMPTY and not self.capturesOnly) or (endPiece != EMPTY and endPiece & COLOR_MASK != allyColor):
+                        if allyColor == WHITE:
                             self.whiteKinglocation = (row + i, col + j)
                         else:
                             self.blackKinglocation = (row + i, col + j)
                         inCheck, pins, checks = self.checkForPinsAndChecks()
                         if not inCheck:
-                            moves.append(Move((row, col), (row + i, col + j), self.board))
-                        if allyColor == 'w':
+                            moves.append(Move(row * 8 + col, (row + i) * 8 + col + j, squares))
+                        if allyColor == WHITE:
                             self.whiteKinglocation = (row, col)
                         else:
                             self.blackKinglocation = (row, col)
-        self.getcastleMoves(row, col, moves, allyColor)
+        if not self.capturesOnly:
+            self.getcastleMoves(row, col, moves, allyColor)
 
     def getcastleMoves(self, row, col, moves, allyColor):
         inCheck = self.squareUnderAttack(row, col, allyColor)
@@ -415,92 +932,108 @@ class GameState:
             self.getQueensidecastleMoves(row, col, moves, allyColor)
 
     def getKingsidecastleMoves(self, row, col, moves, allyColor):
-        if self.board[row][col+1] == "--" and self.board[row][col+2] == "--" and not self.squareUnderAttack(row, col + 1, allyColor) and not self.squareUnderAttack(row, col + 2, allyColor):
-            moves.append(Move((row, col), (row, col + 2), self.board, castle=True))
+        kingSq = row * 8 + col
+        if self.squares[kingSq + 1] == EMPTY and self.squares[kingSq + 2] == EMPTY and not self.squareUnderAttack(row, col + 1, allyColor) and not self.squareUnderAttack(row, col + 2, allyColor):
+            moves.append(Move(kingSq, kingSq + 2, self.squares, castle=True))
 
     def getQueensidecastleMoves(self, row, col, moves, allyColor):
-        if self.board[row][col-1] == "--" and self.board[row][col-2] == "--" and self.board[row][col-3] == "--" and not self.squareUnderAttack(row, col - 1, allyColor) and not self.squareUnderAttack(row, col - 2, allyColor):
-            moves.append(Move((row, col), (row, col - 2), self.board, castle=True))
+        kingSq = row * 8 + col
+        if self.squares[kingSq - 1] == EMPTY and self.squares[kingSq - 2] == EMPTY and self.squares[kingSq - 3] == EMPTY and not self.squareUnderAttack(row, col - 1, allyColor) and not self.squareUnderAttack(row, col - 2, allyColor):
+            moves.append(Move(kingSq, kingSq - 2, self.squares, castle=True))
 
     def checkForPinsAndChecks(self):
+        squares = self.squares
         pins = []
         checks = []
         inCheck = False
         if self.whiteToMove:
-            enemyColor = "b"
-            allyColor = "w"
+            enemyColor = BLACK
+            allyColor = WHITE
             startRow = self.whiteKinglocation[0]
             startCol = self.whiteKinglocation[1]
         else:
-            enemyColor = "w"
-            allyColor = "b"
+            enemyColor = WHITE
+            allyColor = BLACK
             startRow = self.blackKinglocation[0]
             startCol = self.blackKinglocation[1]
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1),
-                      (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+        kingSq = startRow * 8 + startCol
+        for j, ray in enumerate(RAYS[kingSq]):
+            d = DIRECTIONS[j]
             possiblePin = ()
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K':
+            for i, target in enumerate(ray, 1):
+                endPiece = squares[target]
+                if endPiece == EMPTY:
+                    continue
+                type = endPiece & TYPE_MASK
+                if endPiece & COLOR_MASK == allyColor:
+                    if type != KING:
                         if possiblePin == ():
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else:
-                            break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        if (0 <= j <= 3 and type == 'R') or (4 <= j <= 7 and type == 'B') or \
-                            (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == ():
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else:
-                                pins.append(possiblePin)
-                                break
+                            possiblePin = (target >> 3, target & 7, d[0], d[1])
                         else:
                             break
+                elif (0 <= j <= 3 and type == ROOK) or (4 <= j <= 7 and type == BISHOP) or \
+                    (i == 1 and type == PAWN and j in PAWN_CHECK_DIRECTIONS[enemyColor]) or \
+                        (type == QUEEN) or (i == 1 and type == KING):
+                    if possiblePin == ():
+                        inCheck = True
+                        checks.append((target >> 3, target & 7, d[0], d[1]))
+                    else:
+                        pins.append(possiblePin)
+                    break
                 else:
                     break
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N':
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        enemyKnight = enemyColor | KNIGHT
+        for target, dRow, dCol in KNIGHT_TARGETS[kingSq]:
+            if squares[target] == enemyKnight:
+                inCheck = True
+                checks.append((target >> 3, target & 7, dRow, dCol))
         return inCheck, pins, checks
 
     def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
+        packed = move.packed
+        startSq = packed & 63
+        endSq = (packed >> MOVE_END_SHIFT) & 63
+        pieceMoved = (packed >> MOVE_PIECE_SHIFT) & 15
+        pieceCaptured = (packed >> MOVE_CAPTURED_SHIFT) & 15
+        if pieceMoved == WHITE | KING:
             self.whiteCastleKingside = False
             self.whiteCastleQueenside = False
-        elif move.pieceMoved == 'bK':
+        elif pieceMoved == BLACK | KING:
             self.blackCastleKingside = False
             self.blackCastleQueenside = False
-        if move.pieceCaptured == 'wR' and move.endRow == 7 and move.endCol == 0:
-            self.whiteCastleQueenside = False
-        if move.pieceCaptured == 'wR' and move.endRow == 7 and move.endCol == 7:
-            self.whiteCastleKingside = False
-        if move.pieceCaptured == 'bR' and move.endRow == 0 and move.endCol == 0:
-            self.blackCastleQueenside = False
-        if move.pieceCaptured == 'bR' and move.endRow == 0 and move.endCol == 7:
-            self.blackCastleKingside = False
+        elif pieceMoved == WHITE | ROOK:
+            if startSq == ROOK_HOME_SQUARES[WHITE][0]:
+                self.whiteCastleQueenside = False
+            elif startSq == ROOK_HOME_SQUARES[WHITE][1]:
+                self.whiteCastleKingside = False
+        elif pieceMoved == BLACK | ROOK:
+            if startSq == ROOK_HOME_SQUARES[BLACK][0]:
+                self.blackCastleQueenside = False
+            elif startSq == ROOK_HOME_SQUARES[BLACK][1]:
+                self.blackCastleKingside = False
+        if pieceCaptured == WHITE | ROOK:
+            if endSq == ROOK_HOME_SQUARES[WHITE][0]:
+                self.whiteCastleQueenside = False
+            elif endSq == ROOK_HOME_SQUARES[WHITE][1]:
+                self.whiteCastleKingside = False
+        elif pieceCaptured == BLACK | ROOK:
+            if endSq == ROOK_HOME_SQUARES[BLACK][0]:
+                self.blackCastleQueenside = False
+            elif endSq == ROOK_HOME_SQUARES[BLACK][1]:
+                self.blackCastleKingside = False
 
-    def getBoardString(self):
-        boardString = ""
-        for row in self.board:
-            for square in row:
-                boardString += square
-        return boardString
+    def repetitionCount(self):
+        # Số lần thế cờ hiện tại đã xuất hiện, tính cả lần này. Chỉ xét các thế cờ cùng bên đi (cách 2 nửa nước)
+        # và không lùi quá nước ăn quân/đi tốt gần nhất, vì trước đó không thể có thế cờ giống hiện tại
+        keys = self.positionKeys
+        if self.fiftyMoveCounter < 4:
+            return 1
+        key = keys[-1]
+        count = 1
+        for i in range(len(keys) - 5, max(len(keys) - 2 - self.fiftyMoveCounter, -1), -2):
+            if keys[i] == key:
+                count += 1
+        return count
 
 class castleRights:
     def __init__(self, wks, wqs, bks, bqs):
@@ -508,63 +1041,120 @@ class castleRights:
         self.wqs = wqs
         self.bks = bks
         self.bqs = bqs
+        self.mask = wks | wqs << 1 | bks << 2 | bqs << 3
 
 class Move:
+    __slots__ = ('packed', 'moveID')
+
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {value: key for key, value in ranksToRows.items()}
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {value: key for key, value in filesToCols.items()}
     pieceNotation = {"P": "", "R": "R", "N": "N", "B": "B", "Q": "Q", "K": "K"}
 
-    def __init__(self, startSquare, endSquare, board, isEnpassantMove=False, castle=False):
-        self.startRow = startSquare[0]
-        self.startCol = startSquare[1]
-        self.endRow = endSquare[0]
-        self.endCol = endSquare[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.castle = castle
+    def __init__(self, startSq, endSq, squares, isEnpassantMove=False, castle=False, promotionPiece=QUEEN):
+        pieceMoved = squares[startSq]
         if isEnpassantMove:
-            self.pieceCaptured = board[self.startRow][self.endCol]
+            pieceCaptured = squares[(startSq & 56) | (endSq & 7)]
+            packed = ENPASSANT_FLAG
         else:
-            self.pieceCaptured = board[self.endRow][self.endCol]
-        self.isCapture = self.pieceCaptured != '--'
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
-        gs = GameState()
-        if gs.playerWantsToPlayAsBlack:
-            self.isPawnPromotion = (self.pieceMoved == "wp" and self.endRow == 7) or (
-                self.pieceMoved == "bp" and self.endRow == 0)
-        else:
-            self.isPawnPromotion = (self.pieceMoved == "wp" and self.endRow == 0) or (
-                self.pieceMoved == "bp" and self.endRow == 7)
-        self.isEnpassantMove = isEnpassantMove
+            pieceCaptured = squares[endSq]
+            packed = CASTLE_FLAG if castle else 0
+        if PROMOTION_ROWS[pieceMoved][endSq >> 3]:
+            packed |= promotionPiece << MOVE_PROMOTION_SHIFT
+        packed |= startSq | endSq << MOVE_END_SHIFT | pieceMoved << MOVE_PIECE_SHIFT | pieceCaptured << MOVE_CAPTURED_SHIFT
+        self.packed = packed
+        self.moveID = packed & MOVE_ID_MASK
+
+    @property
+    def startSq(self):
+        return self.packed & 63
+
+    @property
+    def endSq(self):
+        return (self.packed >> MOVE_END_SHIFT) & 63
+
+    @property
+    def startRow(self):
+        return (self.packed >> 3) & 7
+
+    @property
+    def startCol(self):
+        return self.packed & 7
+
+    @property
+    def endRow(self):
+        return (self.packed >> (MOVE_END_SHIFT + 3)) & 7
+
+    @property
+    def endCol(self):
+        return (self.packed >> MOVE_END_SHIFT) & 7
+
+    @property
+    def pieceMoved(self):
+        return (self.packed >> MOVE_PIECE_SHIFT) & 15
+
+    @property
+    def pieceCaptured(self):
+        return (self.packed >> MOVE_CAPTURED_SHIFT) & 15
+
+    @property
+    def promotionPiece(self):
+        return (self.packed >> MOVE_PROMOTION_SHIFT) & 7
+
+    @property
+    def isPawnPromotion(self):
+        return (self.packed >> MOVE_PROMOTION_SHIFT) & 7 != EMPTY
+
+    @property
+    def isCapture(self):
+        return (self.packed >> MOVE_CAPTURED_SHIFT) & 15 != EMPTY
+
+    @property
+    def isEnpassantMove(self):
+        return self.packed & ENPASSANT_FLAG != 0
+
+    @property
+    def castle(self):
+        return self.packed & CASTLE_FLAG != 0
 
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
     def getChessNotation(self):
         return self.getPieceNotation(self.pieceMoved, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
+    def getUciNotation(self):
+        # Dạng nước đi của giao thức UCI: ô đi, ô đến và quân phong cấp viết thường (e7e8q)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += PIECE_NAMES[self.promotionPiece][1].lower()
+        return notation
+
     def getRankFile(self, row, col):
         return self.colsToFiles[col] + self.rowsToRanks[row]
 
     def getPieceNotation(self, piece, col):
-        if piece[1] == 'p':
+        if piece & TYPE_MASK == PAWN:
             return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
-        return self.pieceNotation[piece[1]] + self.colsToFiles[col]
+        return self.pieceNotation[PIECE_NAMES[piece][1]] + self.colsToFiles[col]
 
     def __str__(self):
         if self.castle:
             return "O-O" if self.endCol == 6 else "O-O-O"
         startSquare = self.getRankFile(self.startRow, self.startCol)
         endSquare = self.getRankFile(self.endRow, self.endCol)
-        if self.pieceMoved[1] == 'p':
+        if self.pieceMoved & TYPE_MASK == PAWN:
             if self.isCapture:
                 return startSquare + "x" + endSquare
             else:
                 return startSquare + endSquare
-        moveString = self.pieceMoved[1]
+        moveString = PIECE_NAMES[self.pieceMoved][1]
         if self.isCapture:
             return moveString + self.colsToFiles[self.startCol] + "x" + endSquare
-        return moveString + self.colsToFiles[self.startCol] + endSquare
\ No newline at end of file
+        return moveString + self.colsToFiles[self.startCol] + endSquare
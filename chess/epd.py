@@ -0,0 +1,180 @@
+# chess/epd.py
+import argparse
+import os
+import queue
+import re
+import sys
+import time
+from collections import deque
+from . import chessAi
+from .engine import newGameState
+from .pgn import parseSan
+
+PROGRESS_INTERVAL = 2.0  # Số giây giữa hai dòng báo tiến độ
+PENDING_PER_WORKER = 4  # Số thế cờ gửi trước cho mỗi tiến trình, giới hạn bộ nhớ khi file rất lớn
+OPERATION_TOKEN_PATTERN = re.compile(r'"[^"]*"|;|[^\s;]+')
+
+
+def parseEpd(line):
+    # Một dòng EPD: 4 trường FEN đầu (không có bộ đếm nước) và các opcode "tên toán hạng...;".
+    # Trả về (fen, {opcode: [toán hạng]}); hmvc/fmvn trong opcode được dùng làm bộ đếm nước của FEN
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD: {line!r}")
+    operations = {}
+    tokens = []
+    for token in OPERATION_TOKEN_PATTERN.findall(fields[4] if len(fields) > 4 else "") + [';']:
+        if token != ';':
+            tokens.append(token)
+        elif tokens:
+            operations[tokens[0]] = [operand.strip('"') for operand in tokens[1:]]
+            tokens = []
+    halfMoves = operations.get("hmvc", ["0"])[0]
+    fullMoves = operations.get("fmvn", ["1"])[0]
+    return " ".join(fields[:4] + [halfMoves, fullMoves]), operations
+
+
+def analysePosition(lineNumber, line, depth, timeLimit, backend, timeLeft=None, movesToGo=None):
+    # Chạy trong tiến trình của pool: tìm một thế cờ với trạng thái sạch, trả về dict kết quả
+    # (hoặc {"error": ...} nếu dòng EPD không hợp lệ). timeLeft/movesToGo: tìm như khi đồng hồ còn bấy nhiêu giây
+    try:
+        fen, operations = parseEpd(line)
+        gs = newGameState(backend, fen)
+        validMoves = gs.getValidMoves()
+        bestMoves = [parseSan(gs, san, validMoves) for san in operations.get("bm", [])]
+        avoidMoves = [parseSan(gs, san, validMoves) for san in operations.get("am", [])]
+    except ValueError as error:
+        return {"line": lineNumber, "epd": line, "error": str(error)}
+    result = {"line": lineNumber, "epd": line, "id": operations.get("id", [""])[0], "move": None,
+              "solved": None, "depth": 0, "score": 0, "pv": [], "nodes": 0, "time": 0.0}
+    if not validMoves:
+        return result
+    chessAi.newGame()
+    results = queue.Queue()
+    start = time.perf_counter()
+    chessAi.findBestMove(gs, validMoves, results, timeLimit=timeLimit, maxDepth=depth, timeLeft=timeLeft,
+                         movesToGo=movesToGo, shuffle=False, useBook=False)
+    move = results.get()
+    info = chessAi.lastSearchInfo
+    if bestMoves or avoidMoves:
+        result["solved"] = move in bestMoves if bestMoves else move not in avoidMoves
+    result.update(move=move.getUciNotation(), depth=info["depth"], score=info["score"],
+                  pv=[pvMove.getUciNotation() for pvMove in info["pv"]], nodes=chessAi.nodesSearched,
+                  time=time.perf_counter() - start)
+    return result
+
+
+def formatResult(result):
+    # Dòng EPD gốc cộng các opcode chuẩn: acd (độ sâu), acn (số nút), acs (giây), ce (centipawn cho bên đi)
+    # hoặc dm (chiếu hết sau n nước); nước đi và pv ghi theo ký hiệu UCI
+    epd = result["epd"].rstrip().rstrip(';')
+    if "error" in result:
+        return f"{epd}; c9 \"{result['error']}\";"
+    if result["move"] is None:
+        return f"{epd}; acd 0; c9 \"no legal moves\";"
+    score = result["score"]
+    mateIn = chessAi.mateDistance(score)
+    if mateIn is not None:
+        scoreText = f"dm {mateIn}"
+    else:
+        scoreText = f"ce {round(score * 100)}"
+    return f"{epd}; acd {result['depth']}; acn {result['nodes']}; acs {result['time']:.2f}; {scoreText}; " \
+           f"sm {result['move']}; pv {' '.join(result['pv'])};"
+
+
+def readPositions(file):
+    # Đọc lần lượt từng dòng, bỏ dòng trống và chú thích #
+    for lineNumber, line in enumerate(file, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield lineNumber, line
+
+
+def runBatch(positions, output, depth=None, timeLimit=None, workers=1, backend="mailbox", log=sys.stderr,
+             timeLeft=None, movesToGo=None):
+    # Gửi các thế cờ cho pool tiến trình nhưng chỉ giữ tối đa workers * PENDING_PER_WORKER kết quả đang chờ,
+    # ghi kết quả ngay theo đúng thứ tự đầu vào. Trả về thống kê tổng
+    stats = {"positions": 0, "errors": 0, "solved": 0, "tested": 0, "nodes": 0}
+    start = time.perf_counter()
+    lastReport = start
+
+    def record(result):
+        nonlocal lastReport
+        output.write(formatResult(result) + "\n")
+        output.flush()
+        if "error" in result:
+            stats["errors"] += 1
+            log.write(f"line {result['line']}: {result['error']}\n")
+            return
+        stats["positions"] += 1
+        stats["nodes"] += result["nodes"]
+        if result["solved"] is not None:
+            stats["tested"] += 1
+            stats["solved"] += result["solved"]
+        now = time.perf_counter()
+        if now - lastReport >= PROGRESS_INTERVAL:
+            lastReport = now
+            log.write(f"{stats['positions']} positions  {stats['positions'] / (now - start):.2f} positions/s\n")
+
+    if workers == 1:
+        for lineNumber, line in positions:
+            record(analysePosition(lineNumber, line, depth, timeLimit, backend, timeLeft, movesToGo))
+    else:
+        from multiprocessing import Pool
+        with Pool(workers) as pool:
+            pending = deque()
+            for lineNumber, line in positions:
+                pending.append(pool.apply_async(analysePosition, (lineNumber, line, depth, timeLimit, backend,
+                                                                  timeLeft, movesToGo)))
+                if len(pending) >= workers * PENDING_PER_WORKER:
+                    record(pending.popleft().get())
+            while pending:
+                record(pending.popleft().get())
+    stats["time"] = time.perf_counter() - start
+    stats["positionsPerSecond"] = stats["positions"] / max(stats["time"], 1e-9)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chess.epd",
+                                     description="Search every position of an EPD file in parallel.")
+    parser.add_argument("epd", help="EPD file, read one line at a time ('-' for stdin)")
+    parser.add_argument("--depth", type=int, help="search depth per position (default 4 without --movetime)")
+    parser.add_argument("--movetime", type=float, help="seconds per position")
+    parser.add_argument("--timeleft", type=float,
+                        help="search each position as if this many seconds were left on the clock")
+    parser.add_argument("--movestogo", type=int, help="moves left until the next time control, with --timeleft")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of search processes")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("-o", "--output", help="write the annotated EPD to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.depth is not None and args.depth < 1 or args.movetime is not None and args.movetime <= 0 \
+            or args.timeleft is not None and args.timeleft <= 0 or args.movestogo is not None and args.movestogo < 1:
+        parser.error("--depth, --movetime, --timeleft and --movestogo must be positive")
+    if args.movestogo is not None and args.timeleft is None:
+        parser.error("--movestogo needs --timeleft")
+    timed = args.movetime is not None or args.timeleft is not None
+    depth = args.depth if args.depth is not None or timed else chessAi.DEPTH
+    try:
+        source = sys.stdin if args.epd == "-" else open(args.epd)
+        output = open(args.output, "w") if args.output else sys.stdout
+    except OSError as error:
+        parser.error(str(error))
+    try:
+        stats = runBatch(readPositions(source), output, depth, args.movetime, args.workers, args.backend,
+                         timeLeft=args.timeleft, movesToGo=args.movestogo)
+    finally:
+        for file in (source, output):
+            if file not in (sys.stdin, sys.stdout):
+                file.close()
+    solved = f"  solved {stats['solved']}/{stats['tested']}" if stats["tested"] else ""
+    sys.stderr.write(f"{stats['positions']} positions ({stats['errors']} errors)  time {stats['time']:.2f}s  "
+                     f"{stats['positionsPerSecond']:.2f} positions/s  {stats['nodes']} nodes{solved}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
 # chess/main.py
 import sys
 import os
+import time
 import pygame as p
-from .engine import GameState, Move
-from .chessAi import findRandomMoves, findBestMove, scoreBoard
-from multiprocessing import Process, Queue
+from .engine import newGameState, Move, PIECE_NAMES, EMPTY, BLACK, COLOR_MASK, QUEEN, ROOK, BISHOP, KNIGHT
+from .chessAi import findRandomMoves, scoreBoard
+from .worker import EngineWorker
+from .pgn import gameToSan, writeGame
 
 # Đường dẫn tuyệt đối đến thư mục gốc CHESS-AI
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -32,6 +34,19 @@ IMAGES = {}
 SET_WHITE_AS_BOT = False
 SET_BLACK_AS_BOT = True
 
+# Sách khai cuộc (tạo bằng python -m chess.book build); bỏ qua nếu không có file
+BOOK_PATH = os.path.join(BASE_DIR, "book.bin")
+
+# Phím S lưu ván đang chơi vào cuối file PGN này
+GAMES_PATH = os.path.join(BASE_DIR, "games.pgn")
+
+# AI suy nghĩ trước trên thời gian của người chơi (đoán nước trả lời)
+PONDER = True
+
+# Bộ sinh nước đi của engine: "mailbox" hoặc "bitboard"
+ENGINE_BACKEND = "mailbox"
+PROMOTION_PIECES = {'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT}
+
 # Màu sắc
 LIGHT_SQUARE_COLOR = (237, 238, 209)
 DARK_SQUARE_COLOR = (119, 153, 82)
@@ -62,7 +77,7 @@ def pawnPromotionPopup(screen, gs):
         p.Rect(400, 200, button_width, button_height)
     ]
 
-    if gs.whiteToMove:
+    if not gs.whiteToMove:
         button_images = [
             p.transform.smoothscale(p.image.load(os.path.join(BASE_DIR, "images1", "bQ.png")), (100, 100)),
             p.transform.smoothscale(p.image.load(os.path.join(BASE_DIR, "images1", "bR.png")), (100, 100)),
@@ -105,7 +120,7 @@ def main():
     screen.fill(p.Color(LIGHT_SQUARE_COLOR))
     moveLogFont = p.font.SysFont("Times New Roman", 12, False, False)
     infoFont = p.font.SysFont("Times New Roman", 20, False, False)
-    gs = GameState()
+    gs = newGameState(ENGINE_BACKEND)
     if gs.playerWantsToPlayAsBlack:
         gs.board = gs.board1
     validMoves = gs.getValidMoves()
@@ -120,13 +135,9 @@ def main():
     playerWhiteHuman = not SET_WHITE_AS_BOT
     playerBlackHuman = not SET_BLACK_AS_BOT
     AIThinking = False
-    moveFinderProcess = None
+    engineWorker = EngineWorker(ENGINE_BACKEND, BOOK_PATH)
     moveUndone = False
     pieceCaptured = False
-    positionHistory = ""
-    previousPos = ""
-    countMovesForDraw = 0
-    COUNT_DRAW = 0
 
     while running:
         humanTurn = (gs.whiteToMove and playerWhiteHuman) or (not gs.whiteToMove and playerBlackHuman)
@@ -148,17 +159,23 @@ def main():
                         playerClicks.append(squareSelected)
                     if len(playerClicks) == 2 and humanTurn:
                         print(f"Player clicks: {playerClicks}")
-                        move = Move(playerClicks[0], playerClicks[1], gs.board)
+                        startSq = playerClicks[0][0] * 8 + playerClicks[0][1]
+                        endSq = playerClicks[1][0] * 8 + playerClicks[1][1]
+                        move = Move(startSq, endSq, gs.squares)
                         print(f"Attempting move: {move}")
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
-                                if gs.board[validMoves[i].endRow][validMoves[i].endCol] != '--':
+                                if move.isPawnPromotion:
+                                    promotion_choice = pawnPromotionPopup(screen, gs)
+                                    move = Move(startSq, endSq, gs.squares, promotionPiece=PROMOTION_PIECES[promotion_choice])
+                                    validMove = next(m for m in validMoves if m == move)
+                                else:
+                                    validMove = validMoves[i]
+                                if gs.board[validMove.endRow][validMove.endCol] != '--':
                                     pieceCaptured = True
-                                gs.makeMove(validMoves[i])
+                                gs.makeMove(validMove)
                                 print("Move made successfully")
                                 if move.isPawnPromotion:
-                                    promotion_choice = pawnPromotionPopup(screen, gs)
-                                    gs.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotion_choice
                                     if promote_sound:
                                         promote_sound.play()
                                     pieceCaptured = False
@@ -185,23 +202,32 @@ def main():
                     animate = False
                     gameOver = False
                     if AIThinking:
-                        if moveFinderProcess:
-                            moveFinderProcess.terminate()
+                        engineWorker.cancelSearch()
                         AIThinking = False
                     moveUndone = True
                     print("Undo move")
+                if e.key == p.K_m and AIThinking:
+                    # Đi ngay: AI dừng tìm và đi nước tốt nhất đã tìm được
+                    engineWorker.stopSearch()
+                    print("Move now")
+                if e.key == p.K_s:
+                    if gs.checkmate:
+                        result = '0-1' if gs.whiteToMove else '1-0'
+                    elif gs.stalemate or gs.repetitionCount() >= 3:
+                        result = '1/2-1/2'
+                    else:
+                        result = '*'
+                    saveGame(gs, result, playerWhiteHuman, playerBlackHuman)
                 if e.key == p.K_r:
-                    gs = GameState()
+                    gs = newGameState(ENGINE_BACKEND)
                     validMoves = gs.getValidMoves()
                     squareSelected = ()
                     playerClicks = []
                     moveMade = False
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        if moveFinderProcess:
-                            moveFinderProcess.terminate()
-                        AIThinking = False
+                    engineWorker.newGame()
+                    AIThinking = False
                     moveUndone = True
                     print("Reset game")
 
@@ -209,18 +235,15 @@ def main():
             print("AI turn starting")
             if not AIThinking:
                 AIThinking = True
-                returnQueue = Queue()
-                moveFinderProcess = Process(target=findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start()
-                print("AI process started")
-            if not moveFinderProcess.is_alive():
-                print("AI process finished")
-                try:
-                    AIMove = returnQueue.get(timeout=1)
-                    print(f"AI move: {AIMove}")
-                except Queue.Empty:
-                    print("AI move retrieval timed out, selecting random move")
-                    AIMove = findRandomMoves(validMoves)
+                if engineWorker.ponderHit(gs, validMoves):
+                    print("Ponder hit, continuing the search")
+                else:
+                    engineWorker.startSearch(gs, validMoves)
+                    print("AI search started")
+            AIMove = engineWorker.poll()
+            if not engineWorker.searching:
+                bookMove = engineWorker.lastInfo is not None and engineWorker.lastInfo["book"]
+                print(f"AI move: {AIMove}{' (book)' if bookMove else ''}")
                 if AIMove is None:
                     AIMove = findRandomMoves(validMoves)
                     print("AI returned None, selected random move")
@@ -228,9 +251,10 @@ def main():
                     pieceCaptured = True
                 gs.makeMove(AIMove)
                 print("AI move made")
+                nextHumanTurn = (gs.whiteToMove and playerWhiteHuman) or (not gs.whiteToMove and playerBlackHuman)
+                if PONDER and nextHumanTurn and engineWorker.startPonder(gs):
+                    print("AI pondering")
                 if AIMove.isPawnPromotion:
-                    promotion_choice = pawnPromotionPopup(screen, gs)
-                    gs.board[AIMove.endRow][AIMove.endCol] = AIMove.pieceMoved[0] + promotion_choice
                     if promote_sound:
                         promote_sound.play()
                     pieceCaptured = False
@@ -250,19 +274,6 @@ def main():
 
         if moveMade:
             print("Processing moveMade")
-            if countMovesForDraw in [0, 1, 2, 3]:
-                countMovesForDraw += 1
-            if countMovesForDraw == 4:
-                positionHistory += gs.getBoardString()
-                if previousPos == positionHistory:
-                    COUNT_DRAW += 1
-                    positionHistory = ""
-                    countMovesForDraw = 0
-                else:
-                    previousPos = positionHistory
-                    positionHistory = ""
-                    countMovesForDraw = 0
-                    COUNT_DRAW = 0
             if animate:
                 print("Animating move")
                 animateMove(gs.moveLog[-1], screen, gs.board, clock)
@@ -275,7 +286,7 @@ def main():
 
         drawGameState(screen, gs, validMoves, squareSelected, moveLogFont, infoFont)
 
-        if COUNT_DRAW == 1:
+        if gs.repetitionCount() >= 3:
             gameOver = True
             text = 'Draw due to repetition'
             drawEndGameText(screen, text)
@@ -287,10 +298,24 @@ def main():
             gameOver = True
             text = 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate'
             drawEndGameText(screen, text)
+        if gameOver and engineWorker.pondering:
+            engineWorker.cancelSearch()
 
         clock.tick(MAX_FPS)
         p.display.flip()
 
+    engineWorker.close()
+
+def saveGame(gs, result, playerWhiteHuman, playerBlackHuman):
+    startFen, sanMoves = gameToSan(gs)
+    headers = {"Event": "Chess-AI game", "Date": time.strftime("%Y.%m.%d"),
+               "White": "Human" if playerWhiteHuman else "Chess-AI",
+               "Black": "Human" if playerBlackHuman else "Chess-AI"}
+    with open(GAMES_PATH, "a") as file:
+        writeGame(file, headers, sanMoves, result, startFen)
+    print(f"Game saved to {GAMES_PATH}")
+
+
 def drawGameState(screen, gs, validMoves, squareSelected, moveLogFont, infoFont):
     drawSquare(screen)
     highlightSquares(screen, gs, validMoves, squareSelected)
@@ -379,12 +404,12 @@ def animateMove(move, screen, board, clock):
         color = colors[(move.endRow + move.endCol) % 2]
         endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
         p.draw.rect(screen, color, endSquare)
-        if move.pieceCaptured != '--':
+        if move.pieceCaptured != EMPTY:
             if move.isEnpassantMove:
-                enPassantRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
+                enPassantRow = move.endRow + 1 if move.pieceCaptured & COLOR_MASK == BLACK else move.endRow - 1
                 endSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+            screen.blit(IMAGES[PIECE_NAMES[move.pieceCaptured]], endSquare)
+        screen.blit(IMAGES[PIECE_NAMES[move.pieceMoved]], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
         p.display.flip()
         clock.tick(240)
 
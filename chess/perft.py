@@ -0,0 +1,118 @@
+# chess/perft.py
+import argparse
+import sys
+import time
+from .engine import newGameState
+
+# Các thế cờ kiểm tra bộ sinh nước đi cùng số nút đã biết: (tên, FEN, [(độ sâu, số nút), ...])
+PERFT_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [(1, 20), (2, 400), (3, 8902), (4, 197281), (5, 4865609)]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [(1, 48), (2, 2039), (3, 97862), (4, 4085603)]),
+    ("rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [(1, 14), (2, 191), (3, 2812), (4, 43238), (5, 674624)]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [(1, 6), (2, 264), (3, 9467), (4, 422333)]),
+    ("discovered promotion", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [(1, 44), (2, 1486), (3, 62379), (4, 2103487)]),
+    ("symmetric middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [(1, 46), (2, 2079), (3, 89890), (4, 3894594)]),
+    ("illegal en passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", [(1, 18), (2, 92), (3, 1670), (4, 10138), (6, 1134888)]),
+    ("illegal en passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", [(1, 13), (2, 102), (3, 1266), (4, 10276), (6, 1015133)]),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", [(1, 15), (2, 126), (3, 1928), (4, 13931), (6, 1440467)]),
+    ("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", [(1, 15), (2, 66), (3, 1198), (4, 6399), (6, 661072)]),
+    ("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", [(1, 16), (2, 71), (3, 1286), (4, 7418), (6, 803711)]),
+    ("castling rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", [(1, 26), (2, 1141), (3, 27826), (4, 1274206)]),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", [(1, 44), (2, 1494), (3, 50509), (4, 1720476)]),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", [(1, 11), (2, 133), (3, 1442), (4, 19174), (6, 3821001)]),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", [(1, 29), (2, 165), (3, 5160), (4, 31961), (5, 1004658)]),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", [(1, 9), (2, 40), (3, 472), (4, 2661), (6, 217342)]),
+    ("underpromote to give check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", [(1, 6), (2, 27), (3, 273), (4, 1329), (6, 92683)]),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", [(1, 2), (2, 6), (3, 13), (4, 63), (6, 2217)]),
+    ("stalemate and checkmate 1", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", [(1, 10), (2, 25), (3, 268), (4, 926), (7, 567584)]),
+    ("stalemate and checkmate 2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", [(1, 37), (2, 183), (3, 6559), (4, 23527)]),
+]
+
+
+def perft(gs, depth):
+    # Số nút lá ở đúng độ sâu depth; tầng cuối chỉ đếm số nước chứ không đi thử
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    # Số nút của từng nước ở gốc, để so với engine khác khi perft lệch
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move.getUciNotation(), perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+
+
+def runSuite(maxDepth, backend="mailbox", out=sys.stdout):
+    # Chạy perft cho mọi cặp (độ sâu, số nút) không sâu hơn maxDepth; trả về số lần sai
+    failures = 0
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, expectedCounts in PERFT_POSITIONS:
+        for depth, expected in expectedCounts:
+            if depth > maxDepth:
+                continue
+            gs = newGameState(backend, fen)
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed = time.perf_counter() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            status = "OK" if nodes == expected else "FAIL"
+            if nodes != expected:
+                failures += 1
+            out.write(f"{name:28} depth {depth}  nodes {nodes:9d}  expected {expected:9d}  {status:4}  "
+                      f"{elapsed:7.2f}s  {nodes / max(elapsed, 1e-9):9.0f} nps\n")
+    out.write(f"total nodes {totalNodes}  time {totalTime:.2f}s  {totalNodes / max(totalTime, 1e-9):.0f} nps  "
+              f"failures {failures}\n")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m chess.perft",
+                                     description="Count move-generator leaf nodes and measure nodes per second.")
+    parser.add_argument("--depth", type=int, default=4, help="perft depth (suite: maximum depth to run)")
+    parser.add_argument("--fen", help="run a single position instead of the built-in suite")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    args = parser.parse_args(argv)
+
+    if args.fen is None and not args.divide:
+        return 1 if runSuite(args.depth, args.backend) else 0
+
+    try:
+        gs = newGameState(args.backend, args.fen or PERFT_POSITIONS[0][1])
+    except ValueError as error:
+        parser.error(str(error))
+    start = time.perf_counter()
+    if args.divide:
+        nodes = 0
+        for notation, count in divide(gs, args.depth):
+            print(f"{notation}: {count}")
+            nodes += count
+    else:
+        nodes = perft(gs, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f"nodes {nodes}  time {elapsed:.2f}s  {nodes / max(elapsed, 1e-9):.0f} nps")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# chess/pgn.py
+import re
+import sys
+import time
+from .engine import newGameState, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, TYPE_MASK, Move
+
+SAN_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+SAN_LETTERS = {pieceType: letter for letter, pieceType in SAN_PIECES.items()}
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# Bảy thẻ bắt buộc của PGN, ghi trước các thẻ khác theo đúng thứ tự này
+SEVEN_TAG_ROSTER = (("Event", "?"), ("Site", "?"), ("Date", "????.??.??"), ("Round", "?"), ("White", "?"),
+                    ("Black", "?"), ("Result", "*"))
+PGN_LINE_WIDTH = 80
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+HEADER_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+TOKEN_PATTERN = re.compile(r'\{|\}|\(|\)|;|[^\s{}();]+')
+
+
+def readGames(file):
+    # Đọc lần lượt từng ván trong file PGN (đối tượng file văn bản) mà không nạp cả file vào bộ nhớ.
+    # Trả về (headers, danh sách nước SAN, kết quả); bỏ qua chú thích {...}, ;..., biến phụ (...) và $n
+    headers = {}
+    moves = []
+    commentDepth = 0  # đang trong chú thích {...}
+    variationDepth = 0
+    for line in file:
+        line = line.strip()
+        if commentDepth == 0 and variationDepth == 0 and line.startswith('['):
+            match = HEADER_PATTERN.match(line)
+            if match:
+                if moves:
+                    # Ván trước không ghi kết quả ở cuối
+                    yield headers, moves, headers.get("Result", "*")
+                    headers, moves = {}, []
+                headers[match.group(1)] = ESCAPE_PATTERN.sub(r'\1', match.group(2))
+                continue
+        if line.startswith('%'):
+            continue
+        for token in TOKEN_PATTERN.findall(line):
+            if commentDepth:
+                if token == '}':
+                    commentDepth = 0
+                continue
+            if token == '{':
+                commentDepth = 1
+            elif token == ';':
+                break
+            elif token == '(':
+                variationDepth += 1
+            elif token == ')':
+                variationDepth = max(0, variationDepth - 1)
+            elif variationDepth:
+                continue
+            elif token in RESULTS:
+                yield headers, moves, token
+                headers, moves = {}, []
+            elif not token.startswith('$'):
+                token = MOVE_NUMBER_PATTERN.sub('', token)
+                if token:
+                    moves.append(token)
+    if moves or headers:
+        yield headers, moves, headers.get("Result", "*")
+
+
+def parseSan(gs, san, validMoves=None):
+    # Tìm nước đi hợp lệ ứng với ký hiệu SAN (Nf3, exd5, O-O, e8=Q+...); báo ValueError nếu không có
+    # hoặc có nhiều hơn một nước khớp. Không truyền validMoves thì chỉ sinh nước cho các quân có thể đi
+    # tới ô đích (getPieceMoves) thay vì cả bàn cờ, nhanh hơn nhiều khi đọc cả file PGN
+    text = san.rstrip('+#!?').replace('0', 'O')
+    if text in ("O-O", "O-O-O"):
+        if validMoves is None:
+            kingRow, kingCol = gs.whiteKinglocation if gs.whiteToMove else gs.blackKinglocation
+            validMoves = gs.getPieceMoves(kingRow * 8 + kingCol)
+        for move in validMoves:
+            if move.castle and (move.endCol == 6) == (text == "O-O"):
+                return move
+        raise ValueError(f"Illegal move {san!r}")
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Invalid SAN move {san!r}")
+    pieceLetter, fromFile, fromRank, target, promotionLetter = match.groups()
+    pieceType = SAN_PIECES[pieceLetter] if pieceLetter else PAWN
+    endRow, endCol = Move.ranksToRows[target[1]], Move.filesToCols[target[0]]
+    startCol = Move.filesToCols[fromFile] if fromFile else None
+    startRow = Move.ranksToRows[fromRank] if fromRank else None
+    promotion = SAN_PIECES[promotionLetter] if promotionLetter else 0
+    if validMoves is None:
+        piece = (WHITE if gs.whiteToMove else BLACK) | pieceType
+        validMoves = []
+        for sq, value in enumerate(gs.squares):
+            # Tốt chỉ có thể tới từ cột đích hoặc (khi ăn quân) cột ghi trong SAN
+            if value == piece and (startCol is None or sq & 7 == startCol) and (startRow is None or sq >> 3 == startRow) \
+                    and (pieceType != PAWN or sq & 7 == (endCol if startCol is None else startCol)):
+                validMoves.extend(gs.getPieceMoves(sq))
+    candidates = []
+    for move in validMoves:
+        if move.endRow != endRow or move.endCol != endCol or move.pieceMoved & TYPE_MASK != pieceType:
+            continue
+        if startCol is not None and move.startCol != startCol:
+            continue
+        if startRow is not None and move.startRow != startRow:
+            continue
+        if move.isPawnPromotion and move.promotionPiece != (promotion or QUEEN):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move {san!r}")
+    return candidates[0]
+
+
+def getSan(gs, move, validMoves=None):
+    # Ký hiệu SAN của nước hợp lệ move ở thế cờ gs: chỉ ghi cột/hàng xuất phát khi cần phân biệt,
+    # thêm + hoặc # sau khi đi thử nước đó
+    if move.castle:
+        san = "O-O" if move.endCol == 6 else "O-O-O"
+    else:
+        pieceType = move.pieceMoved & TYPE_MASK
+        target = move.getRankFile(move.endRow, move.endCol)
+        if pieceType == PAWN:
+            san = (Move.colsToFiles[move.startCol] + 'x' if move.isCapture else '') + target
+            if move.isPawnPromotion:
+                san += '=' + SAN_LETTERS[move.promotionPiece]
+        else:
+            if validMoves is None:
+                validMoves = [other for sq, value in enumerate(gs.squares) if value == move.pieceMoved
+                              and sq != move.startRow * 8 + move.startCol for other in gs.getPieceMoves(sq)]
+            rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved
+                      and other.endRow == move.endRow and other.endCol == move.endCol and other != move]
+            origin = ''
+            if rivals:
+                if all(other.startCol != move.startCol for other in rivals):
+                    origin = Move.colsToFiles[move.startCol]
+                elif all(other.startRow != move.startRow for other in rivals):
+                    origin = Move.rowsToRanks[move.startRow]
+                else:
+                    origin = move.getRankFile(move.startRow, move.startCol)
+            san = SAN_LETTERS[pieceType] + origin + ('x' if move.isCapture else '') + target
+    # Thử nước đi để tìm dấu chiếu; giữ lại các cờ của gs vì makeMove/getValidMoves ghi đè chúng
+    flags = gs.checkmate, gs.stalemate, gs.inCheck, gs.pins, gs.checks
+    gs.makeMove(move)
+    if gs.checkForPinsAndChecks()[0]:
+        san += '#' if not gs.getValidMoves() else '+'
+    gs.undoMove()
+    gs.checkmate, gs.stalemate, gs.inCheck, gs.pins, gs.checks = flags
+    return san
+
+
+def replayGame(gs, sanMoves):
+    # Đi lần lượt các nước SAN trên gs. Mỗi Move được trả ra trước khi đi, lúc gs vẫn là thế cờ trước nước đó,
+    # để người gọi đọc thế cờ (khoá Zobrist, FEN...). Báo ValueError ở nước không hợp lệ
+    for san in sanMoves:
+        move = parseSan(gs, san)
+        yield move
+        gs.makeMove(move)
+
+
+def startingPosition(headers, backend="mailbox"):
+    # Thế cờ đầu ván: theo thẻ FEN nếu có, không thì thế cờ ban đầu
+    return newGameState(backend, headers.get("FEN"))
+
+
+def gameToSan(gs):
+    # (FEN thế cờ đầu, danh sách nước SAN) của ván đang chơi trên gs. Các nước được đi lại trên một bản sao
+    # từ thế cờ đầu nên gs (cờ chiếu hết, hoà của giao diện) không bị thay đổi
+    replay = type(gs)()
+    if gs.startFen is not None:
+        replay.loadFen(gs.startFen)
+    elif gs.playerWantsToPlayAsBlack:
+        replay.board = replay.board1
+    startFen = replay.getFen()
+    sanMoves = []
+    for move in gs.moveLog:
+        sanMoves.append(getSan(replay, move))
+        replay.makeMove(move)
+    return startFen, sanMoves
+
+
+def formatGame(headers, sanMoves, result="*", startFen=None, comment=None):
+    # Văn bản PGN của một ván: bảy thẻ bắt buộc trước, SetUp/FEN khi không bắt đầu từ thế cờ ban đầu,
+    # các nước được ngắt dòng ở PGN_LINE_WIDTH cột; comment (nếu có) được ghi trước kết quả
+    headers = dict(headers)
+    headers["Result"] = result
+    if startFen is not None and startFen != START_FEN:
+        headers["SetUp"] = "1"
+        headers["FEN"] = startFen
+    fen = headers.get("FEN", START_FEN).split()
+    whiteToMove = len(fen) < 2 or fen[1] == 'w'
+    moveNumber = int(fen[5]) if len(fen) > 5 and fen[5].isdigit() else 1
+    lines = []
+    for name, default in SEVEN_TAG_ROSTER:
+        lines.append(formatHeader(name, headers.get(name, default)))
+    for name, value in headers.items():
+        if name not in dict(SEVEN_TAG_ROSTER):
+            lines.append(formatHeader(name, value))
+    lines.append("")
+
+    tokens = []
+    for ply, san in enumerate(sanMoves):
+        if whiteToMove:
+            tokens.append(f"{moveNumber}.")
+        elif ply == 0:
+            tokens.append(f"{moveNumber}...")
+        tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    if comment:
+        tokens.append("{" + comment.replace("}", ")") + "}")
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > PGN_LINE_WIDTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def formatHeader(name, value):
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'[{name} "{escaped}"]'
+
+
+def writeGame(file, headers, sanMoves, result="*", startFen=None, comment=None):
+    file.write(formatGame(headers, sanMoves, result, startFen, comment))
+
+
+def main(argv=None):
+    import argparse  # chỉ cần cho dòng lệnh; module này được chessAi nhập lúc khởi động
+    parser = argparse.ArgumentParser(prog="python -m chess.pgn",
+                                     description="Replay every game of PGN files and report the throughput.")
+    parser.add_argument("pgn", nargs="+", help="PGN files, read one game at a time")
+    parser.add_argument("--extract", help="write every position reached to this EPD file, with the game result")
+    parser.add_argument("--no-replay", action="store_true", help="only parse the movetext, do not replay the moves")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    args = parser.parse_args(argv)
+
+    games = plies = errors = 0
+    start = time.perf_counter()
+    lastReport = start
+    try:
+        extract = open(args.extract, "w") if args.extract else None
+    except OSError as error:
+        parser.error(str(error))
+    for path in args.pgn:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for headers, sanMoves, result in readGames(file):
+                games += 1
+                if args.no_replay:
+                    plies += len(sanMoves)
+                    continue
+                try:
+                    gs = startingPosition(headers, args.backend)
+                    for _ in replayGame(gs, sanMoves):
+                        plies += 1
+                        if extract is not None:
+                            extract.write(f"{' '.join(gs.getFen().split()[:4])} c9 \"{result}\";\n")
+                except ValueError as error:
+                    errors += 1
+                    sys.stderr.write(f"{path}: game {games}: {error}\n")
+                now = time.perf_counter()
+                if now - lastReport >= 2.0:
+                    lastReport = now
+                    sys.stderr.write(f"{games} games  {games / (now - start):.0f} games/s\n")
+    if extract is not None:
+        extract.close()
+    elapsed = time.perf_counter() - start
+    print(f"{games} games ({errors} with errors)  {plies} plies  time {elapsed:.2f}s  "
+          f"{games / max(elapsed, 1e-9):.0f} games/s  {plies / max(elapsed, 1e-9):.0f} plies/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# chess/transposition.py
+import mmap
+
+# Loại cận của điểm lưu trong bảng
+EXACT = 0
+LOWER_BOUND = 1  # điểm >= giá trị lưu (đã cắt beta)
+UPPER_BOUND = 2  # điểm <= giá trị lưu (không nước nào vượt alpha)
+
+# Mỗi ô gồm hai số 64 bit: khoá Zobrist XOR dữ liệu, và dữ liệu đóng gói
+# bit 0-14: moveID nước tốt nhất, 15-21: độ sâu, 22-23: loại cận,
+# 24-31: thế hệ tìm kiếm, 32-63: điểm * SCORE_SCALE + SCORE_OFFSET.
+# Lưu key ^ data thay cho key để nhiều tiến trình cùng ghi bảng chung mà không cần khoá:
+# ô bị ghi dở (key của lần ghi này, data của lần ghi khác) sẽ không khớp khoá khi tra và bị bỏ qua
+ENTRY_BYTES = 16
+SCORE_SCALE = 1000
+SCORE_OFFSET = 1 << 31
+MOVE_ID_MASK = (1 << 15) - 1
+
+
+class TranspositionTable:
+    # Bảng băm kích thước cố định, mỗi bucket hai ô: ô 0 ưu tiên độ sâu, ô 1 luôn bị ghi đè.
+    # shared=True đặt bảng trong multiprocessing.shared_memory để các tiến trình tìm kiếm song song dùng chung
+    def __init__(self, sizeMB=16, shared=False):
+        self.sharedMemory = None
+        self.memory = None
+        self.ownsMemory = False
+        self.resize(sizeMB, shared)
+
+    @classmethod
+    def attach(cls, name, sizeMB):
+        # Mở bảng chung do tiến trình cha tạo (theo sharedName). Tiến trình con dùng chung resource tracker
+        # với tiến trình cha nên vùng nhớ vẫn được dọn nếu tiến trình cha chết giữa chừng
+        from multiprocessing import shared_memory
+        table = cls.__new__(cls)
+        table.sizeMB = sizeMB
+        table.memory = None
+        table.sharedMemory = shared_memory.SharedMemory(name=name)
+        table.ownsMemory = False
+        table.bucketCount = table.sharedMemory.size // (2 * ENTRY_BYTES)
+        table.useBuffer(table.sharedMemory.buf)
+        table.generation = 0
+        table.resetStats()
+        return table
+
+    @property
+    def shared(self):
+        return self.sharedMemory is not None
+
+    @property
+    def sharedName(self):
+        return self.sharedMemory.name if self.sharedMemory is not None else None
+
+    def useBuffer(self, buffer):
+        half = 16 * self.bucketCount
+        self.view = buffer
+        self.keys = buffer[:half].cast('Q')
+        self.data = buffer[half:2 * half].cast('Q')
+
+    def resize(self, sizeMB, shared=None):
+        if shared is None:
+            shared = self.shared
+        self.close()
+        self.sizeMB = sizeMB
+        self.bucketCount = max(1, int(sizeMB * 1024 * 1024) // (2 * ENTRY_BYTES))
+        if shared:
+            # Chỉ nhập multiprocessing khi cần để không làm chậm lúc khởi động (python -m chess.uci)
+            from multiprocessing import shared_memory
+            self.sharedMemory = shared_memory.SharedMemory(create=True, size=32 * self.bucketCount)
+            self.ownsMemory = True
+            self.useBuffer(self.sharedMemory.buf)
+        else:
+            # mmap ẩn danh: hệ điều hành cấp trang đã xoá về 0 khi dùng tới nên tạo bảng lớn gần như không tốn
+            # thời gian; MAP_PRIVATE để tiến trình con tạo bằng fork không ghi chung vào bảng này
+            if hasattr(mmap, "MAP_PRIVATE"):
+                self.memory = mmap.mmap(-1, 32 * self.bucketCount, flags=mmap.MAP_PRIVATE)
+            else:
+                self.memory = mmap.mmap(-1, 32 * self.bucketCount)
+            self.useBuffer(memoryview(self.memory))
+        self.generation = 0
+        self.resetStats()
+
+    def close(self):
+        # Trả vùng nhớ của bảng; vùng nhớ chung do tiến trình này tạo thì xoá luôn
+        if self.memory is None and self.sharedMemory is None:
+            return
+        self.keys.release()
+        self.data.release()
+        if self.memory is not None:
+            self.view.release()
+            self.memory.close()
+            self.memory = None
+        else:
+            self.sharedMemory.close()
+            if self.ownsMemory:
+                self.sharedMemory.unlink()
+            self.sharedMemory = None
+            self.ownsMemory = False
+
+    def clear(self):
+        if self.sharedMemory is not None:
+            self.sharedMemory.buf[:] = bytes(32 * self.bucketCount)
+            self.generation = 0
+            self.resetStats()
+        else:
+            self.resize(self.sizeMB)
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def newSearch(self):
+        # Đánh dấu thế hệ mới để các ô của lần tìm trước được ưu tiên thay thế
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        # Trả về (depth, score, bound, moveID) hoặc None nếu không có thế cờ này
+        self.probes += 1
+        index = (key % self.bucketCount) * 2
+        keys = self.keys
+        data = self.data
+        packed = data[index]
+        if not packed or keys[index] ^ packed != key:
+            packed = data[index + 1]
+            if not packed or keys[index + 1] ^ packed != key:
+                return None
+        self.hits += 1
+        return ((packed >> 15) & 0x7F, ((packed >> 32) - SCORE_OFFSET) / SCORE_SCALE,
+                (packed >> 22) & 3, packed & MOVE_ID_MASK)
+
+    def store(self, key, depth, score, bound, moveID):
+        index = (key % self.bucketCount) * 2
+        keys = self.keys
+        data = self.data
+        stored = data[index]
+        storedKey = keys[index] ^ stored
+        replaced = data[index + 1]
+        if replaced and keys[index + 1] ^ replaced == key:
+            slot = index + 1
+            previous = replaced
+        else:
+            storedDepth = (stored >> 15) & 0x7F
+            storedGeneration = (stored >> 24) & 0xFF
+            if storedKey == key or stored == 0 or depth >= storedDepth or storedGeneration != self.generation:
+                slot = index
+                previous = stored if storedKey == key else 0
+                # Ô sâu bị đẩy xuống ô luôn-ghi-đè thay vì mất hẳn
+                if stored and storedKey != key:
+                    self.collisions += 1
+                    keys[index + 1] = keys[index]
+                    data[index + 1] = stored
+            else:
+                slot = index + 1
+                previous = 0
+                if replaced:
+                    self.collisions += 1
+        if not moveID and previous:
+            moveID = previous & MOVE_ID_MASK  # giữ nước tốt nhất cũ khi lần này không có
+        self.stores += 1
+        packed = ((int(round(score * SCORE_SCALE)) + SCORE_OFFSET) << 32 | self.generation << 24 |
+                  bound << 22 | min(depth, 0x7F) << 15 | moveID)
+        data[slot] = packed
+        keys[slot] = key ^ packed
+
+    def hashfull(self):
+        # Tỉ lệ phần nghìn số ô đã dùng trong thế hệ hiện tại, lấy mẫu 1000 ô đầu
+        sample = min(1000, len(self.data))
+        used = sum(1 for i in range(sample) if self.data[i] and (self.data[i] >> 24) & 0xFF == self.generation)
+        return used * 1000 // sample
+
+    def stats(self):
+        return {"sizeMB": self.sizeMB, "entries": len(self.keys), "shared": self.shared, "probes": self.probes,
+                "hits": self.hits, "stores": self.stores, "collisions": self.collisions}
+
+
+class PawnHashTable:
+    # Bảng nhỏ lưu kết quả đánh giá cấu trúc tốt theo khoá vị trí tốt, ô mới luôn ghi đè ô cũ
+    def __init__(self, entryCount=16384):
+        self.entryCount = entryCount
+        self.clear()
+
+    def clear(self):
+        self.keys = [0] * self.entryCount
+        self.values = [None] * self.entryCount
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        self.probes += 1
+        index = key % self.entryCount
+        if self.keys[index] == key and self.values[index] is not None:
+            self.hits += 1
+            return self.values[index]
+        return None
+
+    def store(self, key, value):
+        index = key % self.entryCount
+        self.keys[index] = key
+        self.values[index] = value
+
+    def stats(self):
+        return {"entries": self.entryCount, "probes": self.probes, "hits": self.hits,
+                "hitRate": self.hits / self.probes if self.probes else 0.0}
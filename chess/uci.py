@@ -0,0 +1,194 @@
+# chess/uci.py
+import queue
+import sys
+import threading
+from . import chessAi
+from .engine import newGameState
+
+ENGINE_NAME = "Chess-AI"
+ENGINE_AUTHOR = "ntrutuo1"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+class UciEngine:
+    # Giao thức UCI qua stdin/stdout, không dùng pygame. Tìm kiếm chạy ở một luồng riêng để vẫn đọc được
+    # "stop", "isready" trong lúc máy đang nghĩ
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.outputLock = threading.Lock()
+        self.gs = newGameState("mailbox")
+        self.stopEvent = threading.Event()
+        self.ponderHitEvent = threading.Event()
+        # "go infinite" và "go ponder" không được gửi bestmove trước "stop" (hoặc "ponderhit" khi suy nghĩ trước),
+        # kể cả khi tìm kiếm đã xong; luồng tìm chờ event này
+        self.releaseEvent = threading.Event()
+        self.infinite = False
+        self.searchThread = None
+        self.threads = 1
+
+    def send(self, line):
+        with self.outputLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, lines):
+        for line in lines:
+            if not self.handle(line.strip()):
+                break
+        self.stopSearch()
+
+    def handle(self, line):
+        # Trả về False khi gặp "quit"
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {chessAi.HASH_SIZE_MB} min 1 max 1024")
+            self.send("option name Threads type spin default 1 min 1 max 64")
+            self.send("option name BookFile type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.setOption(arguments)
+        elif command == "ucinewgame":
+            self.stopSearch()
+            chessAi.newGame()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(arguments)
+        elif command == "go":
+            self.stopSearch()
+            self.startSearch(arguments)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            # Đối thủ đi đúng nước đoán: từ giờ giới hạn thời gian có hiệu lực và bestmove được gửi khi tìm xong
+            self.ponderHitEvent.set()
+            if not self.infinite:
+                self.releaseEvent.set()
+        elif command == "quit":
+            return False
+        else:
+            self.send(f"info string unknown command: {line}")
+        return True
+
+    def setOption(self, arguments):
+        # setoption name <tên> [value <giá trị>]; tên có thể có dấu cách
+        if "name" not in arguments:
+            return
+        nameEnd = arguments.index("value") if "value" in arguments else len(arguments)
+        name = " ".join(arguments[arguments.index("name") + 1:nameEnd]).lower()
+        value = " ".join(arguments[nameEnd + 1:])
+        try:
+            if name == "hash":
+                chessAi.transpositionTable.resize(max(1, int(value)))
+            elif name == "threads":
+                self.threads = max(1, int(value))
+            elif name == "bookfile":
+                chessAi.setOpeningBook(value if value and value != "<empty>" else None)
+            else:
+                self.send(f"info string unknown option: {name}")
+        except (OSError, ValueError) as error:
+            self.send(f"info string invalid value for {name}: {error}")
+
+    def setPosition(self, arguments):
+        # position startpos|fen <6 trường> [moves <nước UCI>...]
+        movesIndex = arguments.index("moves") if "moves" in arguments else len(arguments)
+        if arguments and arguments[0] == "fen":
+            fen = " ".join(arguments[1:movesIndex])
+        else:
+            fen = START_FEN
+        try:
+            gs = newGameState("mailbox", fen)
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        for notation in arguments[movesIndex + 1:]:
+            move = next((move for move in gs.getValidMoves() if move.getUciNotation() == notation), None)
+            if move is None:
+                self.send(f"info string illegal move: {notation}")
+                break
+            gs.makeMove(move)
+        self.gs = gs
+
+    def startSearch(self, arguments):
+        options = {"timeLimit": None, "maxDepth": None, "nodeLimit": None}
+        values = {}
+        for i, token in enumerate(arguments):
+            if token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes") \
+                    and i + 1 < len(arguments):
+                try:
+                    values[token] = int(arguments[i + 1])
+                except ValueError:
+                    pass
+        if "depth" in values:
+            options["maxDepth"] = max(1, values["depth"])
+        if "nodes" in values:
+            options["nodeLimit"] = values["nodes"]
+        if "movetime" in values:
+            options["timeLimit"] = values["movetime"] / 1000
+        timeKey, incrementKey = ("wtime", "winc") if self.gs.whiteToMove else ("btime", "binc")
+        if timeKey in values:
+            options["timeLeft"] = values[timeKey] / 1000
+            options["increment"] = values.get(incrementKey, 0) / 1000
+            options["movesToGo"] = values.get("movestogo")
+        self.infinite = "infinite" in arguments
+        if self.infinite:
+            options["maxDepth"] = chessAi.MAX_DEPTH
+        elif not values:
+            options["timeLimit"] = chessAi.TIME_LIMIT
+        if "ponder" in arguments:
+            options["ponderHit"] = self.ponderHitEvent
+        self.stopEvent.clear()
+        self.ponderHitEvent.clear()
+        self.releaseEvent.clear()
+        if not self.infinite and "ponder" not in arguments:
+            self.releaseEvent.set()
+        self.searchThread = threading.Thread(target=self.search, args=(self.gs, options), daemon=True)
+        self.searchThread.start()
+
+    def search(self, gs, options):
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            self.releaseEvent.wait()
+            self.send("bestmove 0000")
+            return
+        results = queue.Queue()
+        chessAi.findBestMove(gs, validMoves, results, shuffle=False, onIteration=self.sendInfo,
+                             threads=self.threads, stopEvent=self.stopEvent, **options)
+        move = results.get()
+        self.releaseEvent.wait()
+        ponderMove = chessAi.findPonderMove(gs, move)
+        self.send(f"bestmove {move.getUciNotation()}" + (f" ponder {ponderMove.getUciNotation()}" if ponderMove else ""))
+
+    def sendInfo(self, info):
+        score = info["score"]
+        mateIn = chessAi.mateDistance(score)
+        if mateIn is not None:
+            scoreText = f"mate {mateIn}"
+        else:
+            scoreText = f"cp {round(score * 100)}"
+        milliseconds = max(1, round(info["time"] * 1000))
+        pv = " ".join(move.getUciNotation() for move in info["pv"])
+        self.send(f"info depth {info['depth']} score {scoreText} nodes {info['nodes']} time {milliseconds} "
+                  f"nps {info['nodes'] * 1000 // milliseconds} pv {pv}")
+
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.releaseEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    UciEngine().run(sys.stdin)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# chess/worker.py
+import os
+import queue
+import sys
+from multiprocessing import Event, Pipe, Process
+from . import chessAi
+from .engine import newGameState
+
+
+def engineWorkerLoop(connection, backend, stopEvent, ponderHitEvent, bookPath):
+    # Vòng lặp của tiến trình AI: giữ một GameState riêng, chỉ nhận các nước đi mới qua pipe.
+    # Bảng chuyển vị, bảng tốt, nước sát thủ và lịch sử sống qua các nước, chỉ xoá khi có "newgame"
+    if bookPath is not None and os.path.exists(bookPath):
+        chessAi.setOpeningBook(bookPath)
+    gs = newGameState(backend)
+    if gs.playerWantsToPlayAsBlack:
+        gs.board = gs.board1
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        command = message[0]
+        if command == "quit":
+            break
+        elif command == "newgame":
+            chessAi.newGame()
+            gs = newGameState(backend)
+            if gs.playerWantsToPlayAsBlack:
+                gs.board = gs.board1
+        elif command == "position":
+            syncPosition(gs, message[1])
+        elif command == "go":
+            _, searchId, options = message
+            connection.send(searchPosition(gs, searchId, stopEvent, None, options))
+        elif command == "ponder":
+            # Đi thử nước đoán của đối thủ rồi tìm cho tới khi GUI báo đoán đúng (ponderHitEvent) hoặc dừng;
+            # sau đó lùi lại để vị trí vẫn khớp với lần đồng bộ cuối của GUI
+            _, searchId, predictedMoveID, options = message
+            predictedMove = next((move for move in gs.getValidMoves() if move.moveID == predictedMoveID), None)
+            if predictedMove is None:
+                connection.send(("bestmove", searchId, 0, None))
+                continue
+            gs.makeMove(predictedMove)
+            connection.send(searchPosition(gs, searchId, stopEvent, ponderHitEvent, options))
+            gs.undoMove()
+    connection.close()
+
+
+def syncPosition(gs, moveIDs):
+    # Lùi về phần chung với danh sách nước của GUI rồi đi tiếp phần còn lại. Nước không hợp lệ chỉ được ghi log
+    # và bỏ cùng các nước sau nó; GUI luôn gửi lại cả danh sách nên lần đồng bộ sau sẽ khớp lại vị trí
+    common = 0
+    while common < min(len(moveIDs), len(gs.moveLog)) and gs.moveLog[common].moveID == moveIDs[common]:
+        common += 1
+    while len(gs.moveLog) > common:
+        gs.undoMove()
+    for moveID in moveIDs[common:]:
+        move = next((move for move in gs.getValidMoves() if move.moveID == moveID), None)
+        if move is None:
+            sys.stderr.write(f"Illegal move from GUI ignored: {moveID}\n")
+            return
+        gs.makeMove(move)
+
+
+def searchPosition(gs, searchId, stopEvent, ponderHitEvent, options):
+    results = queue.Queue()
+    chessAi.findBestMove(gs, gs.getValidMoves(), results, stopEvent=stopEvent, ponderHit=ponderHitEvent, **options)
+    move = results.get()
+    if move is None:
+        return ("bestmove", searchId, 0, None)
+    info = chessAi.lastSearchInfo
+    ponderMove = chessAi.findPonderMove(gs, move)
+    return ("bestmove", searchId, move.moveID,
+            {"depth": info["depth"], "score": info["score"], "nodes": info["nodes"],
+             "pv": [pvMove.moveID for pvMove in info["pv"]], "ponder": ponderMove.moveID if ponderMove else 0,
+             "book": info["book"]})
+
+
+class EngineWorker:
+    # Tiến trình AI chạy suốt ván thay cho một Process mới mỗi nước. Vị trí được đồng bộ bằng danh sách moveID
+    # của cả ván, tiến trình AI tự so với nước đã đi của nó nên chỉ đi lại phần khác nhau
+    def __init__(self, backend="mailbox", bookPath=None):
+        self.connection, workerConnection = Pipe()
+        # Tìm kiếm xem cờ này mỗi TIME_CHECK_INTERVAL nút nên dừng được mà không phải giết tiến trình
+        self.stopEvent = Event()
+        self.ponderHitEvent = Event()
+        self.process = Process(target=engineWorkerLoop, args=(workerConnection, backend, self.stopEvent,
+                                                              self.ponderHitEvent, bookPath), daemon=True)
+        self.process.start()
+        workerConnection.close()
+        self.searchId = 0
+        self.pendingResults = 0
+        self.searching = False
+        self.pondering = False
+        self.ponderMoveIDs = []
+        self.validMoves = []
+        self.lastInfo = None
+        self.lastMoveID = 0
+
+    def sync(self, gs):
+        self.connection.send(("position", [move.moveID for move in gs.moveLog]))
+
+    def startSearch(self, gs, validMoves, **options):
+        # options được chuyển nguyên cho chessAi.findBestMove (timeLimit, maxDepth, threads...)
+        self.waitIdle()
+        self.stopEvent.clear()
+        self.sync(gs)
+        self.searchId += 1
+        self.pendingResults += 1
+        self.searching = True
+        self.validMoves = validMoves
+        self.connection.send(("go", self.searchId, options))
+
+    def startPonder(self, gs, **options):
+        # Suy nghĩ trên thời gian của đối thủ: đoán nước trả lời theo chessAi.findPonderMove của lần tìm
+        # vừa rồi, nước AI vừa đi phải là nước cuối của gs. Trả về False nếu không có nước để đoán
+        if not self.lastInfo or not self.lastInfo["ponder"] or not gs.moveLog \
+                or gs.moveLog[-1].moveID != self.lastMoveID:
+            return False
+        ponderMoveID = self.lastInfo["ponder"]
+        self.waitIdle()
+        self.stopEvent.clear()
+        self.ponderHitEvent.clear()
+        self.sync(gs)
+        self.searchId += 1
+        self.pendingResults += 1
+        self.pondering = True
+        self.ponderMoveIDs = [move.moveID for move in gs.moveLog] + [ponderMoveID]
+        self.connection.send(("ponder", self.searchId, ponderMoveID, options))
+        return True
+
+    def ponderHit(self, gs, validMoves):
+        # Gọi khi tới lượt AI: nếu đối thủ đi đúng nước đoán thì lần suy nghĩ trước trở thành lần tìm chính
+        # và trả về True; nếu không thì dừng nó (bảng chuyển vị vẫn giữ) và trả về False
+        if not self.pondering:
+            return False
+        self.pondering = False
+        if [move.moveID for move in gs.moveLog] != self.ponderMoveIDs:
+            self.stopEvent.set()
+            return False
+        # Tiến trình AI tự lùi nước đoán sau khi tìm, GUI đồng bộ lại nó ở lần gửi vị trí sau
+        self.searching = True
+        self.validMoves = validMoves
+        self.ponderHitEvent.set()
+        return True
+
+    def stopSearch(self):
+        # "Đi ngay": tìm kiếm dừng và kết quả (nước tốt nhất tới lúc đó) vẫn được poll trả về
+        self.stopEvent.set()
+
+    def cancelSearch(self):
+        # Dừng và bỏ kết quả của lần tìm đang chạy (khi lùi nước hoặc ván mới)
+        if self.searching or self.pondering:
+            self.stopEvent.set()
+        self.searching = False
+        self.pondering = False
+
+    def waitIdle(self):
+        # Nhận hết kết quả của các lần tìm đã dừng; chỉ chờ vài mili giây vì cờ dừng đã được đặt
+        while self.pendingResults:
+            self.receive()
+
+    def receive(self):
+        _, searchId, moveID, info = self.connection.recv()
+        self.pendingResults -= 1
+        return searchId, moveID, info
+
+    def poll(self):
+        # Trả về nước AI chọn (đối tượng trong validMoves đã truyền vào startSearch) hoặc None nếu chưa xong
+        while self.pendingResults and self.connection.poll():
+            searchId, moveID, info = self.receive()
+            if self.searching and searchId == self.searchId:
+                self.searching = False
+                self.lastInfo = info
+                self.lastMoveID = moveID
+                return next((move for move in self.validMoves if move.moveID == moveID), None)
+        return None
+
+    def newGame(self):
+        self.cancelSearch()
+        self.connection.send(("newgame",))
+
+    def close(self):
+        self.stopEvent.set()
+        if self.process.is_alive():
+            try:
+                self.connection.send(("quit",))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.connection.close()